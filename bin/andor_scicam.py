@@ -3,9 +3,8 @@ import atexit
 import logging
 import subprocess
 import sys
-from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
 
-from asi.utils.xmlrpc import RequestHandler
+from asi.utils.service import ServiceHost
 from asi.scicam.andor import AndorScienceCamera
 
 logger = logging.getLogger(__name__)
@@ -18,23 +17,14 @@ if not '-n' in sys.argv:
     print "Spawning ANDORControlAutomatic.exe"
     child = subprocess.Popen([r'C:\Users\Russ\asi\AndorControl\Release\AndorControlAutomatic.exe'])
 
-
 logger.info("Waiting for AndorControl to start")
 time.sleep(30)
 
-server = SimpleXMLRPCServer(("localhost", 7276),
-                            requestHandler=RequestHandler,
-                            logRequests=False,  
-                            allow_none=True)
-
-server.timeout = .001
-
-server.register_introspection_functions()
-
 science_camera = AndorScienceCamera("127.0.0.1", 7077)
-science_camera.register_xmlrpc_functions(server)
+
+host = ServiceHost(7276)
+host.add(science_camera)
 
 logger.info("Connected to AndorControl")
 
-while 1:
-    server.handle_request()
+host.serve_forever()
@@ -1,25 +1,14 @@
-from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
-
 import asi
-from asi.utils.xmlrpc import RequestHandler
+from asi.utils.service import ServiceHost
 from asi.telescope.ascom import SiTechTelescope
 
 asi.log.init_logging("telescope.log")
 
-server = SimpleXMLRPCServer(("localhost", 7274),
-                            requestHandler=RequestHandler,
-                            logRequests=False,  
-                            allow_none=True)
-
-server.timeout = .001
-
-server.register_introspection_functions()
-
 telescope = SiTechTelescope()
-telescope.register_xmlrpc_functions(server)
+
+host = ServiceHost(7274, threaded=False)
+host.add(telescope, update_interval=.01, watch=('ready', 'get_pos'))
     
 print "ASCOM Telescope Host Running..."
 
-while 1:
-    telescope.update()
-    server.handle_request()
+host.serve_forever()
@@ -6,11 +6,17 @@ from PySide import QtGui
 import asi
 
 class ASIMonitor(QtGui.QWidget):
-    def __init__(self, runman):
+    # Emitted from the subscription's thread, so the widgets are updated from the GUI thread
+    state_changed = QtCore.Signal()
+
+    def __init__(self, runman, subscription):
         super(ASIMonitor, self).__init__()
 
         # RPC to the Run Manager
         self.runman = runman
+
+        # The Run Manager's published state, which the monitor shows
+        self.subscription = subscription
         
         self.layout = QtGui.QVBoxLayout()
         self.setLayout(self.layout)
@@ -18,12 +24,11 @@ class ASIMonitor(QtGui.QWidget):
         self.setWindowTitle("Automated Speckle Interferometry Monitor")
 
         self._init_widgets()
-        
-        self.update_timer = QtCore.QTimer(self)
-        self.update_timer.setSingleShot(False)
-        self.update_timer.setInterval(1000)
-        self.update_timer.timeout.connect(self.update)
-        self.update_timer.start()
+
+        # Update whenever the Run Manager's state changes, rather than polling it
+        self.state_changed.connect(self.update)
+        self.subscription.on(None, lambda topic, value: self.state_changed.emit())
+        self.update()
 
     def _init_widgets(self):
         self.pauseresume_btn = QtGui.QPushButton("Pause")
@@ -139,27 +144,36 @@ class ASIMonitor(QtGui.QWidget):
     def use_step_mode(self):
         self.auto_mode_btn.setChecked(False)
         self.runman.singlestep_mode()
+        self.update()
 
     def use_auto_mode(self):
         self.step_mode_btn.setChecked(False)
         self.runman.automatic_mode()
+        self.update()
         
     def update(self):
-        self.target_lbl.setText(self.runman.current_target_name())
+        state = self.subscription
+
+        if state.connected:
+            self.target_lbl.setText(state.get('target_name') or '')
+
+        else:
+            self.target_lbl.setText("Run Manager not connected")
 
         for lbl in self.status_labels:
             lbl.setStyleSheet('background-color: lightgray')
         
-        self.step_btn.setEnabled(self.runman.ready_to_step() and (not self.auto_mode_btn.isChecked()))
+        self.step_btn.setEnabled(bool(state.get('ready_to_step')) and (not self.auto_mode_btn.isChecked()))
 
-        curstep = self.runman.get_current_actions()
+        curstep = state.get('current_actions')
         print 'UPDATE', curstep
-        getattr(self, curstep + '_lbl').setStyleSheet('background-color: yellow')
+        if curstep:
+            getattr(self, curstep + '_lbl').setStyleSheet('background-color: yellow')
 
             
 if __name__ == '__main__':
     qapp = QtGui.QApplication(sys.argv)
-    win = ASIMonitor(asi.client.RunManager())
+    win = ASIMonitor(asi.client.RunManager(), asi.client.subscribe(asi.client.RUNMAN_DEFAULT_ADDR))
     win.show()
 
     sys.exit(qapp.exec_())
@@ -1,26 +1,16 @@
 #! /usr/bin/env python
 
-from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
-
 import asi
-from asi.utils.xmlrpc import RequestHandler
+from asi.utils.service import ServiceHost
 from asi.slider.phidget_stepper import PhidgetStepperSlider
 
 asi.log.init_logging("slider.log")
 
-server = SimpleXMLRPCServer(("localhost", 7275),
-                            requestHandler=RequestHandler,
-                            allow_none=True,
-                            logRequests=False)
-
-server.timeout = .001
-
-server.register_introspection_functions()
-
 slider = PhidgetStepperSlider()
-slider.register_xmlrpc_functions(server)
+
+host = ServiceHost(7275)
+host.add(slider)
     
 print "Phidget Stepper Slider running..."
 
-while 1:
-    server.handle_request()
+host.serve_forever()
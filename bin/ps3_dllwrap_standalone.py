@@ -132,6 +132,7 @@ server = SimpleXMLRPCServer(("localhost", 7278),
                             allow_none=True)
 server.timeout = .001
 server.register_introspection_functions()
+server.register_multicall_functions()
 
 ps3 = PlateSolve3()
 ps3.register_xmlrpc_functions(server)
@@ -1,23 +1,30 @@
 import sys
+import atexit
 import socket
 import logging
 import xmlrpclib
 
 import asi
 from asi.manager import RunManager
+from asi import config
+from asi.utils import checkpoint
 
 from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
 
 import asi
 from asi.scheduler import InOrderScheduler, WeightedSingleScheduler
 from asi.utils.xmlrpc import RequestHandler
+from asi.utils import binrpc
+from asi.utils import pubsub
 
 server = SimpleXMLRPCServer(("localhost", 7279),
                             requestHandler=RequestHandler,
                             logRequests=False,
                             allow_none=True)
-server.timeout = .001
+binserver = binrpc.BinaryRPCServer(("localhost", 7279 + binrpc.PORT_OFFSET))
+publisher = pubsub.Publisher(("localhost", 7279 + pubsub.PORT_OFFSET))
 server.register_introspection_functions()
+binserver.register_introspection_functions()
 
 asi.log.init_logging("runman.log")
 
@@ -33,8 +40,15 @@ except socket.error:
     logger.critical("Could not connect to scheduler")
     sys.exit()
 
-logger.info("Resetting scheduler...")
-scheduler.reset()
+# If the run manager was restarted mid-night, carry on where it left off, with the scheduler
+# as it was
+recovered = checkpoint.load(config.runman_checkpoint)
+if recovered is None:
+    logger.info("Resetting scheduler...")
+    scheduler.reset()
+
+else:
+    logger.info("Recovering from checkpoint, the scheduler is not reset")
 
 try:
     telescope = asi.client.Telescope()
@@ -83,11 +97,28 @@ rm = RunManager(server,
                 focuser, 
                 science_cam, 
                 acquisition_cam, 
-                platesolve)
+                platesolve,
+                binserver,
+                publisher)
 rm.register_xmlrpc_functions(server)
+rm.register_xmlrpc_functions(binserver)
+
+# The run log is written from a daemon thread, so write or spool what it has queued before exiting
+atexit.register(rm.runlog.flush)
+
+if recovered:
+    rm.restore_state(recovered)
+
+# Poll the devices' readiness concurrently, each from a thread with its own connection, and
+# woken by the device when it publishes that it is ready
+for module, addr, interval in ((telescope, config.telescope_addr, config.telescope_poll),
+                               (slider, config.slider_addr, config.slider_poll),
+                               (science_cam, config.scicam_addr, config.scicam_poll),
+                               (acquisition_cam, config.acquiscam_addr, config.acquiscam_poll),
+                               (platesolve, config.platesolve_addr, config.platesolve_poll)):
+    rm.loop.add_poller(module.name(), module, lambda addr=addr: asi.client.connect(addr), interval,
+                       asi.client.subscribe(addr))
 
-while 1:
-    server.handle_request()
-    rm.update()
+rm.run()
 
 logger.info("Goodbye!")
@@ -1,22 +1,16 @@
-from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
-
 import asi
 from asi.scheduler import InOrderScheduler, WeightedSingleScheduler
-from asi.utils.xmlrpc import RequestHandler
+from asi.utils.service import ServiceHost
 
 asi.log.init_logging("scheduler.log")
 
-server = SimpleXMLRPCServer(("localhost", 7273),
-                            requestHandler=RequestHandler,
-                            logRequests=False,
-                            allow_none=True)
-server.timeout = .001
-server.register_introspection_functions()
-
 rs = InOrderScheduler()
 #rs = WeightedSingleScheduler(asi.client.Telescope())
-rs.register_xmlrpc_functions(server)
 
-while 1:
-    rs.update()
-    server.handle_request()
+host = ServiceHost(7273)
+host.add(rs, update_interval=.1)
+
+# Resume the group that was being observed, if the scheduler was restarted mid-night
+rs.restore_checkpoint()
+
+host.serve_forever()
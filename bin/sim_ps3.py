@@ -19,29 +19,17 @@ class SimPlateSolve3(RPCAble):
     def transform_plate_to_j2000(self, x, y):
         return (0, 0)
 
-from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
-
 import asi
-from asi.utils.xmlrpc import RequestHandler
+from asi.utils.service import ServiceHost
 from asi.slider.simulator import SliderSimulator
 
 asi.log.init_logging("slider.log")
 
-server = SimpleXMLRPCServer(("localhost", 7278),
-                            requestHandler=RequestHandler,
-                            allow_none=True,
-                            logRequests=False)
-
-server.timeout = .001
-
-server.register_introspection_functions()
-
 slider = SimPlateSolve3()
-slider.register_xmlrpc_functions(server)
+
+host = ServiceHost(7278)
+host.add(slider)
     
 print "Slider Simulator Running..."
 
-while 1:
-    server.handle_request()
-
-
+host.serve_forever()
@@ -1,23 +1,12 @@
-from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
-
-from asi.utils.xmlrpc import RequestHandler
+from asi.utils.service import ServiceHost
 
 from asi.telescope.simulator import TelescopeSimulator
 
-server = SimpleXMLRPCServer(("localhost", 7274),
-                            requestHandler=RequestHandler,
-                            logRequests=False,  
-                            allow_none=True)
-
-server.timeout = .001
-
-server.register_introspection_functions()
-
 telescope = TelescopeSimulator()
-telescope.register_xmlrpc_functions(server)
+
+host = ServiceHost(7274)
+host.add(telescope, update_interval=.01, watch=('ready', 'get_pos'))
     
 print "Telescope Simulator Running..."
 
-while 1:
-    telescope.update()
-    server.handle_request()
+host.serve_forever()
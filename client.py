@@ -1,10 +1,16 @@
+import socket
+import logging
 import xmlrpclib
 
-from utils.xmlrpc import RPCClientOverloadWrapper
+from utils.xmlrpc import RPCClientOverloadWrapper, KeepAliveTransport
+from utils import binrpc
+from utils import pubsub
 from db.catalog import ReferenceStar, DoubleStar
 import db
 import config
 
+logger = logging.getLogger(__name__)
+
 TABLE_NAME_MAP = {
     'ReferenceStar' : ReferenceStar,
     'DoubleStar' : DoubleStar,
@@ -18,6 +24,10 @@ ACQUISCAM_DEFAULT_ADDR  = config.acquiscam_addr
 PLATESOLVE_DEFAULT_ADDR = config.platesolve_addr
 RUNMAN_DEFAULT_ADDR     = config.runman_addr
 
+# Seconds any one call may take before it fails
+RPC_TIMEOUT = config.rpc_timeout
+RPC_TRANSPORT = config.rpc_transport
+
 
 """
 Scheduler needs some client side helper code:
@@ -27,19 +37,33 @@ here and returned
 """
 class Scheduler(RPCClientOverloadWrapper):
     def __init__(self, hostname=SCHEDULER_DEFAULT_ADDR):
-        super(Scheduler, self).__init__(hostname)
+        super(Scheduler, self).__init__(hostname, RPC_TIMEOUT, connect(hostname))
+
+    def _lookup(self, table, i):
+        session = db.Session()
+        return session.query(TABLE_NAME_MAP[table]).filter_by(id=i).first()
 
     def get_next_target(self):
-        table, i, band, requester = self._rpc.get_next_target()
+        table, i, band, requester, mpo = self._rpc.get_next_target()
 
-        session = db.Session()
-        star = session.query(TABLE_NAME_MAP[table]).filter_by(id=i).first()
+        return self._lookup(table, i), band, requester, mpo
 
-        return star, band, requester
+    def peek_next_target(self):
+        """
+        Return the target get_next_target will probably return next, or
+        (None, None, None, None) if there are no observable targets
+        """
+        peeked = self._rpc.peek_next_target()
+        if not peeked:
+            return None, None, None, None
+
+        table, i, band, requester, mpo = peeked
+
+        return self._lookup(table, i), band, requester, mpo
 
 class Telescope(RPCClientOverloadWrapper):
     def __init__(self, hostname=TELESCOPE_DEFAULT_ADDR):
-        super(Telescope, self).__init__(hostname)
+        super(Telescope, self).__init__(hostname, RPC_TIMEOUT, connect(hostname))
     
     def slew_obs(self, star):
         assert hasattr(star, 'ra_deg') and hasattr(star, 'dec_deg')
@@ -58,27 +82,58 @@ class AcquisitionCamera(RPCClientOverloadWrapper):
     def plate_solve(self, ra, dec):
         self._rpc.plate_solve(ra, dec)
 '''     
-# The rest are vanilla XMLRPC instance, so configure them in a sane manner then pass off it on
-def _make_xmlrpc_connection(addr):
-    return xmlrpclib.ServerProxy(addr, allow_none=True)
+def connect(addr):
+    """
+    Return a connection to the service at the XML-RPC url addr
+
+    With the binary transport configured, the service's binary protocol is used if it serves
+    it, since it is faster, and XML-RPC if it doesn't(e.g. the IronPython PlateSolve3 wrapper)
+    """
+    if RPC_TRANSPORT == 'binary' and binrpc.available():
+        proxy = binrpc.BinaryServerProxy(binrpc.binary_address(addr), RPC_TIMEOUT)
+        try:
+            proxy._connect()
+            return proxy
+
+        except socket.error, e:
+            logger.info("No binary RPC for {addr}, using XML-RPC: {e}".format(addr=addr, e=e))
+
+    return xmlrpclib.ServerProxy(addr, allow_none=True, transport=KeepAliveTransport(RPC_TIMEOUT))
+
+def subscribe(addr):
+    """
+    Return a utils.pubsub.Subscription to the state published by the service at the XML-RPC
+    url addr
+
+    Device services publish ready(and the telescope get_pos) under those names, and the run
+    manager publishes target_name, current_actions, ready_to_step and auto_mode
+    """
+    return pubsub.Subscription(pubsub.publisher_address(addr))
+
+def _wrap(addr):
+    """
+    Return an RPCClientOverloadWrapper of a connection to addr, so calls can be batched
+    """
+    return RPCClientOverloadWrapper(addr, RPC_TIMEOUT, connect(addr))
 
+# The rest are vanilla XMLRPC instance, so configure them in a sane manner then pass off it on
 '''
 def Telescope(addr=TELESCOPE_DEFAULT_ADDR):
-    return _make_xmlrpc_connection(addr)
+    return connect(addr)
 '''
 
 def Slider(addr=SLIDER_DEFAULT_ADDR):
-    return _make_xmlrpc_connection(addr)
+    return _wrap(addr)
 
 def ScienceCamera(addr=SCICAM_DEFAULT_ADDR):
-    return _make_xmlrpc_connection(addr)
+    return _wrap(addr)
 
 def AcquisitionCamera(addr=ACQUISCAM_DEFAULT_ADDR):
-    return _make_xmlrpc_connection(addr)
+    return _wrap(addr)
 
 def PlateSolve(addr=PLATESOLVE_DEFAULT_ADDR):
-    return _make_xmlrpc_connection(addr)
+    return _wrap(addr)
 
 
 def RunManager(addr=RUNMAN_DEFAULT_ADDR):
-    return _make_xmlrpc_connection(addr)
+    return _wrap(addr)
@@ -16,8 +16,19 @@ print "Using log file: ", log
 print "Using log file: ", log
 
 
+# Site
+# Longitude and latitude of the telescope, in a form ephem understands
+site_lon = config.get('Site', 'lon')
+site_lat = config.get('Site', 'lat')
+
 # Logging
 log_path = config.get('Logging', 'log_path')
+# Append-only log of how long each step of the observing sequence took, see manager.metrics
+metrics_log = config.get('Logging', 'metrics_log')
+# Observations that couldn't be written to the database wait here, see manager.runlog
+runlog_spool = config.get('Logging', 'runlog_spool')
+# Observations the database refused(not for being unreachable) are kept here instead
+runlog_rejects = config.get('Logging', 'runlog_rejects')
 
 # RPC
 scheduler_addr = config.get('RPC', 'scheduler_addr')
@@ -27,6 +38,19 @@ scicam_addr = config.get('RPC', 'scicam_addr')
 acquiscam_addr = config.get('RPC', 'acquiscam_addr')
 platesolve_addr = config.get('RPC', 'platesolve_addr')
 runman_addr = config.get('RPC', 'runman_addr')
+# Seconds a client waits for any one call before giving up on it
+rpc_timeout = float(config.get('RPC', 'timeout'))
+# 'xmlrpc', or 'binary' to use the binary protocol(see utils.binrpc) with services that serve it
+rpc_transport = config.get('RPC', 'transport')
+
+# Polling
+# Seconds between the run manager's readiness polls of each device, at first.  Polls back off
+# while a device stays busy.
+telescope_poll = float(config.get('Polling', 'telescope'))
+slider_poll = float(config.get('Polling', 'slider'))
+scicam_poll = float(config.get('Polling', 'scicam'))
+acquiscam_poll = float(config.get('Polling', 'acquiscam'))
+platesolve_poll = float(config.get('Polling', 'platesolve'))
 
 # Filters
 # Create a dictionary of filter : filter wheel index pairs, starting a 0
@@ -45,6 +69,15 @@ plate_solve_tries = int(config.get('Acquisition', 'plate_solve_tries'))
 # acquisition camera, relative to the center of the acquisition camera
 scicam_x = int(config.get('Acquisition', 'scicam_x'))
 scicam_y = int(config.get('Acquisition', 'scicam_y'))
+# Pointing model fitted to the plate solutions and used to correct slews, see manager.pointing
+pointing_model = config.get('Acquisition', 'pointing_model')
+# Targets within reacquire_radius(degrees) of the last plate solution are reached by a blind
+# offset, which is checked with one exposure of verify_itime
+reacquire_radius = float(config.get('Acquisition', 'reacquire_radius'))
+verify_itime = int(config.get('Acquisition', 'verify_itime'))
+# Check that the target is still in the science camera between the cubes of a burst(see
+# Target.mpo)
+burst_recheck = config.getboolean('Acquisition', 'burst_recheck')
 # The maximum distance(in degrees) that the target can be from the center of field
 ra_err = float(config.get('Acquisition', 'ra_err'))
 dec_err = float(config.get('Acquisition', 'dec_err'))
@@ -56,4 +89,21 @@ slider_motor_id = int(config.get('Slider', 'motor_id'))
 slider_acquis_pos = int(config.get('Slider', 'acquis_pos'))
 slider_sci_pos = int(config.get('Slider', 'sci_pos'))
 
+# Scheduler
+# Append-only log of slew and instrument move durations, written by the run manager
+slew_log = config.get('Scheduler', 'slew_log')
+# Slew time model fitted from slew_log by tools/fit_slew_model.py
+slew_model = config.get('Scheduler', 'slew_model')
+
+# Settling
+# The mount has settled once it has moved less than threshold degrees between samples,
+# samples times in a row.  Samples are interval seconds apart, and it gives up after timeout
+settle_threshold = float(config.get('Settle', 'threshold'))
+settle_interval = float(config.get('Settle', 'interval'))
+settle_samples = int(config.get('Settle', 'samples'))
+settle_timeout = float(config.get('Settle', 'timeout'))
 
+# Checkpoints
+# Where the scheduler and run manager save their state, to resume from after a crash
+scheduler_checkpoint = config.get('Checkpoint', 'scheduler')
+runman_checkpoint = config.get('Checkpoint', 'runman')
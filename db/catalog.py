@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime
 from sqlalchemy.orm import relationship, backref
 
 from base import Base
@@ -73,3 +73,47 @@ class ReferenceStar(Base):
 
     def __repr__(self):
         return '<({obj}) {name}>'.format(obj=self.__class__.__name__, name=self.name)
+
+class RefStarPairing(Base):
+    """
+    One ranked reference star candidate for a double star
+
+    These are precomputed offline by tools/build_refstar_pairs.py, using the same rules as
+    AbstractScheduler.get_next_single_star: rank 0 is the star the scheduler would pick,
+    rank 1 the one it would pick if rank 0 were blacklisted, and so on.
+    """
+    __tablename__ = 'refstar_pairs'
+
+    id = Column(Integer, primary_key=True)
+
+    double_id = Column(Integer, ForeignKey('doublestars.id'), index=True)
+    refstar_id = Column(Integer, ForeignKey('refstars.id'))
+
+    # 0 is the best reference star for the double
+    rank = Column(Integer)
+
+    # Spectral type difference, as numbers from astro.stype_to_number
+    stype_diff = Column(Integer)
+
+    # Distance between the double and reference star in degrees
+    dist = Column(Float)
+
+    # The double's position and spectral type when the pairing was computed
+    # These are used to detect doubles that have changed since
+    double_ra_deg = Column(Float)
+    double_dec_deg = Column(Float)
+    double_stype = Column(String(9))
+
+class RefStarPairingBuild(Base):
+    """
+    A record of each build of the refstar_pairs table, and the state of the reference star
+    catalog it was built against
+    """
+    __tablename__ = 'refstar_pair_builds'
+
+    id = Column(Integer, primary_key=True)
+
+    datetime = Column(DateTime)
+
+    # See tools/build_refstar_pairs.py
+    refstars_signature = Column(String(200))
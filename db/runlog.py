@@ -28,3 +28,6 @@ class Observation(Base):
     ra_deg = Column(Float)
     dec_deg = Column(Float)
 
+    # Unique id given by the run manager, so an observation can't be logged twice
+    record_id = Column(String(36), unique=True, index=True)
+
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+import datetime
+
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime
 from sqlalchemy.orm import relationship, backref
 
 from base import Base
@@ -56,5 +58,9 @@ class Target(Base):
     # The minimum number of hours permissible between two observations of this object
     mindt = Column(Integer, default=12)
 
+    # When this target was added or last changed
+    # The scheduler uses this to reload only the targets that have changed
+    modified = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now, index=True)
+
     def __unicode__(str):
         return unicode(self.star)
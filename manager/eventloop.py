@@ -0,0 +1,246 @@
+import time
+import select
+import socket
+import logging
+
+from polling import DevicePoller, PolledReadiness
+
+logger = logging.getLogger(__name__)
+
+class Readiness(object):
+    """
+    The pending result of an operation on a module, which is done once module.ready() is true
+
+    ready() is polled with an adaptive backoff: quickly at first, since short operations finish
+    quickly, then less and less often up to max_interval while the module stays busy
+    """
+    def __init__(self, module, min_interval, max_interval, backoff):
+        self.module = module
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+        self.interval = min_interval
+        self.due = time.time()
+        self.done = False
+
+    def poll(self, now):
+        """
+        If a poll is due, ask the module if it is ready, and schedule the next poll if it isn't
+        """
+        if now < self.due:
+            return False
+
+        self.done = bool(self.module.ready())
+
+        if not self.done:
+            self.due = now + self.interval
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+
+        return self.done
+
+    def wake(self, now):
+        """
+        Poll again now, as something suggests the module has changed
+        """
+        self.due = now
+        self.interval = self.min_interval
+
+def socket_pair():
+    """
+    Return a pair of connected sockets
+
+    socket.socketpair() isn't available on Windows, so this connects over the loopback
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+
+    a = socket.create_connection(listener.getsockname())
+    b, _ = listener.accept()
+    listener.close()
+
+    return a, b
+
+class EventLoop(object):
+    """
+    Serves XML-RPC requests while the run manager waits on other modules, without spinning
+
+    Between readiness polls the loop blocks in select() on the RPC server's socket, so an
+    idle run manager uses no CPU, and a request(for example a step from the monitor) is
+    handled as soon as it arrives rather than on the next pass of a busy loop.
+
+    Modules given to add_poller() are polled by a thread each instead(see polling), so the
+    devices are checked at the same time and one slow device doesn't hold up the others.
+    Those threads wake the loop through a socket that is selected on with the server.
+
+    on_wait, if it is set, is called whenever what is being waited on may have changed.
+
+    binserver is a binrpc.BinaryRPCServer serving the same functions, whose connections are
+    selected on too.
+    """
+    # Seconds between readiness polls, starting at MIN_POLL and growing by BACKOFF to MAX_POLL
+    MIN_POLL = .05
+    MAX_POLL = 1.
+    BACKOFF = 1.5
+
+    # Seconds between polls of a module that publishes its readiness, in case a change is missed
+    SUBSCRIBED_POLL = 5.
+
+    def __init__(self, server, binserver=None):
+        self.server = server
+        self.binserver = binserver
+
+        # handle_request() is only called once select() says a request is waiting
+        self.server.timeout = 0
+
+        # The Readiness of the modules being waited on
+        self.pending = []
+
+        # { id(module) : DevicePoller }
+        self.pollers = {}
+
+        self.on_wait = None
+
+        # Pollers write to wakeup_w to wake up select()
+        self.wakeup_w, self.wakeup_r = socket_pair()
+        self.wakeup_r.setblocking(0)
+
+    def serve(self, timeout):
+        """
+        Handle RPC requests for up to timeout seconds(None blocks until one arrives)
+
+        Returns once at least one request has been handled, or the timeout passes
+        """
+        handled = False
+        while True:
+            try:
+                binary = self.binserver.sockets() if self.binserver else []
+                readable, _, _ = select.select([self.server, self.wakeup_r] + binary, [], [], timeout)
+
+            except select.error, e:
+                # Interrupted by a signal
+                logger.debug("select interrupted: " + str(e))
+                return handled
+
+            if not readable:
+                return handled
+
+            if self.wakeup_r in readable:
+                self._drain_wakeup()
+                handled = True
+
+            if self.server in readable:
+                self.server.handle_request()
+                handled = True
+
+            if set(binary).intersection(readable):
+                self.binserver.handle_readable(readable)
+                handled = True
+
+            # Drain anything else that has queued up, but don't block again
+            timeout = 0
+
+    def _drain_wakeup(self):
+        try:
+            while self.wakeup_r.recv(4096):
+                pass
+
+        except socket.error:
+            # Nothing left to read
+            pass
+
+    def notify(self):
+        """
+        Wake the loop from another thread
+        """
+        try:
+            self.wakeup_w.send('x')
+
+        except socket.error, e:
+            logger.warning("Could not wake the event loop: " + str(e))
+
+    def add_poller(self, name, module, connect, interval, subscription=None):
+        """
+        Poll module's readiness from a thread of its own, every interval seconds at first
+
+        connect() must return a new connection to the same device, for the thread to use.  If
+        subscription is given, the module's published readiness wakes the poller instead.
+        """
+        poller = DevicePoller(name, module, connect, interval, max(interval, self.MAX_POLL), self.notify,
+                              subscription, self.SUBSCRIBED_POLL)
+        poller.start()
+
+        self.pollers[id(module)] = poller
+
+    def pause(self, seconds):
+        """
+        Serve requests for seconds, like time.sleep()
+        """
+        end = time.time() + seconds
+        while time.time() < end:
+            self.serve(end - time.time())
+
+    def wake(self):
+        """
+        Poll every module being waited on straight away, rather than when its backoff ends
+
+        Called from RPC methods, to react to an event as soon as it happens
+        """
+        now = time.time()
+        for r in self.pending:
+            r.wake(now)
+
+    def readiness(self, module):
+        """
+        Return a Readiness for module, polled with this loop's intervals
+        """
+        if id(module) in self.pollers:
+            return PolledReadiness(self.pollers[id(module)])
+
+        return Readiness(module, self.MIN_POLL, self.MAX_POLL, self.BACKOFF)
+
+    def poll(self, pending, now):
+        """
+        Poll the Readinesses in pending that are due, and return the ones that aren't done
+        """
+        return [r for r in pending if not r.poll(now)]
+
+    def sleep(self, pending):
+        """
+        Serve requests until the next poll of anything in pending is due
+        """
+        self.pending = pending
+        self._waiting_changed()
+
+        # Only modules with pollers means waiting for them to wake the loop
+        due = min(r.due for r in pending)
+        self.serve(None if due == float('inf') else max(due - time.time(), 0))
+
+    def wait(self, *modules):
+        """
+        Serve requests until every module in modules is ready
+        """
+        pending = [self.readiness(mod) for mod in modules]
+
+        try:
+            while True:
+                pending = self.poll(pending, time.time())
+                if not pending:
+                    return
+
+                self.sleep(pending)
+
+        finally:
+            self.pending = []
+            self._waiting_changed()
+
+    def _waiting_changed(self):
+        if self.on_wait is not None:
+            self.on_wait()
+
+    def waiting_on(self):
+        """
+        The modules that the current wait hasn't seen become ready
+        """
+        return [r.module for r in self.pending]
@@ -6,10 +6,17 @@ import datetime
 import math
 
 from .. import db
-from asi.db.runlog import Observation
 from .. import log
 from ..utils.xmlrpc import RPCAble, rpc_method
+from ..utils import journal
+from ..utils import checkpoint
 from .. import config
+from eventloop import EventLoop
+from sequencer import Sequence, Step
+from settle import SettleDetector
+from metrics import StepMetrics, night
+from pointing import PointingModel
+from runlog import RunLogWriter
 
 logger = logging.getLogger(__name__)
 
@@ -48,13 +55,19 @@ def periodize(ang):
     return ang
 
 class RunManager(RPCAble):
-    IDLE_GRANULARITY = .1
+    # Seconds to wait for RPC requests on each pass while shut down
+    IDLE_WAIT = 1.
     
-    def __init__(self, rpc_server, scheduler, telescope, slider, focuser, scicam, acquiscam, plate_solver):
+    def __init__(self, rpc_server, scheduler, telescope, slider, focuser, scicam, acquiscam, plate_solver,
+                 binary_server=None, publisher=None):
         super(RunManager, self).__init__()
-        self.waiting_on = []
         
         self.rpc_server = rpc_server
+        self.loop = EventLoop(rpc_server, binary_server)
+        self.loop.on_wait = self.publish_state
+
+        # A utils.pubsub.Publisher of the run manager's state, for the monitor
+        self.publisher = publisher
         self.scheduler = scheduler
         self.telescope = telescope
         self.slider = slider
@@ -62,12 +75,47 @@ class RunManager(RPCAble):
         self.scicam = scicam
         self.acquiscam = acquiscam
         self.plate_solver = plate_solver
+
+        self.mount_settle = SettleDetector(self.loop,
+                                           self.telescope.get_pos,
+                                           config.settle_threshold,
+                                           config.settle_interval,
+                                           config.settle_samples,
+                                           config.settle_timeout)
         
         self.session = db.Session()
 
+        self.runlog = RunLogWriter(config.runlog_spool, config.runlog_rejects)
+        self.runlog.start()
+
+        self.metrics = StepMetrics(config.metrics_log)
+
+        # Fitted to every plate solution, and used to correct every slew
+        self.pointing = PointingModel(config.site_lon, config.site_lat, config.pointing_model)
+
+        # { night : [acquisition frames taken by each slew_until_within_bounds] }
+        self.acquisition_frames = {}
+
+        # (ra, dec, solved) of where the telescope is known to point, from the last plate
+        # solution(solved is True) or a blind offset from it(solved is False).  None once the
+        # telescope has been moved anywhere else.
+        self.known_position = None
+
         self.auto_mode = True
 
         self.current_step = 'slew'
+
+        # (target, band, requester, mpo) and (start ra, start dec, start time) of the next target
+        # and the slew to it, if they were started while the last target's cube was taken
+        self.next_target = None
+        self.next_slew = None
+
+        # (target, band, requester, mpo) of the target the scheduler has handed out, but not
+        # been told the outcome of.  It is checkpointed so it can be resumed after a crash.
+        self.in_progress = None
+
+        # { night : seconds } saved by overlapping steps, see _finish_target()
+        self.time_saved = {}
         
         self.startup()
 
@@ -75,9 +123,10 @@ class RunManager(RPCAble):
         """
         The idle process function
 
-        This function gets called while RunManager is waiting for other modules to complete work
+        This function gets called while RunManager is waiting for other modules to complete work.
+        It handles any RPC requests that are waiting, without blocking
         """
-        self.rpc_server.handle_request()
+        self.loop.serve(0)
         
     def _idle_while_busy(self, *modules):
         """
@@ -85,11 +134,9 @@ class RunManager(RPCAble):
 
         For example, the telescope mount will return False while slewing, and True otherwise.
 
-        This function calls self._idle() until all modules listed in modules are ready
-
-        granularity is a value in seconds that determines how often the ready methods are checked.
-        self._idle() is called continously, but the ready methods are only called every 
-        granularity seconds to cut down on unecessary TCP traffic
+        This function serves RPC requests until all modules listed in modules are ready.  The
+        ready methods are polled with a backoff(see eventloop.EventLoop), and the RPC server
+        is waited on with select() in between, so waiting doesn't use the CPU
         """         
         logger.debug("Entering Idle State...")
         logger.debug("Waiting For:")
@@ -99,34 +146,23 @@ class RunManager(RPCAble):
         # Guarantee _idle() is called at least once
         self._idle()
 
-        last_ready_check = time.time()
-
-        '''
-        # Return true if all modules are ready, false otherwise
-        check_ready = lambda: all(map(lambda mod: mod.ready(), modules))
-        all_ready = check_ready()
+        self.loop.wait(*modules)
 
-        while not all_ready:
-            self._idle()
+        logger.debug("Exiting Idle State...")
 
-            # If it's been granularity seconds, check the readiness
-            if (time.time() - last_ready_check) >= self.IDLE_GRANULARITY:
-                all_ready = check_ready()
-        '''
-        self.waiting_on = filter(lambda mod: not mod.ready(), modules)
-        while self.waiting_on:
+    def run(self):
+        """
+        Run forever
+        """
+        while 1:
             self._idle()
-
-            if (time.time() - last_ready_check) >= self.IDLE_GRANULARITY:
-                self.waiting_on = filter(lambda mod: not mod.ready(), modules)
-
-        logger.debug("Exiting Idle State...")
+            self.update()
 
     def update_idle(self):
         """
         The main loop, while the telescope is shut down(during the day, usually)
         """
-        pass
+        self.loop.serve(self.IDLE_WAIT)
 
     def update_running(self):
         """
@@ -137,19 +173,35 @@ class RunManager(RPCAble):
 
         except:
             print sys.exc_info()
+
+            # Whatever was fetched or started for the target being skipped is abandoned with it
+            self.next_target = None
+            self.next_slew = None
             self.skip_target(self.target)
 
     @rpc_method
     def singlestep_mode(self):
         self.auto_mode = False
+        self.publish_state()
 
     @rpc_method
     def automatic_mode(self):
         self.auto_mode = True
+        self.publish_state()
 
     @rpc_method
     def step(self):
         self.single_continue = True
+        self.loop.wake()
+
+    @rpc_method
+    def device_ready(self, name=None):
+        """
+        Tell the run manager that a module(name) may have finished, so its readiness is
+        checked now instead of when its poll interval ends
+        """
+        logger.debug("Woken by {name}".format(name=name))
+        self.loop.wake()
 
     @rpc_method
     def in_auto_mode(self):
@@ -160,7 +212,8 @@ class RunManager(RPCAble):
         """
         Returns true if the only thing we are waiting on is the step input from the user
         """
-        return len(self.waiting_on) == 1 and isinstance(self.waiting_on[0], RunManager)
+        waiting_on = self.loop.waiting_on()
+        return len(waiting_on) == 1 and isinstance(waiting_on[0], RunManager)
             
     @rpc_method
     def current_target_name(self):
@@ -181,6 +234,9 @@ class RunManager(RPCAble):
         print "TASK BOUNDARY", name
         print '#'*100
         self.current_step = name
+        self.publish_state()
+        self.metrics.boundary(name, getattr(self, 'target', None))
+        self.save_checkpoint()
         
         if not self.auto_mode:
             self.single_continue = False
@@ -193,6 +249,20 @@ class RunManager(RPCAble):
         
         
         
+    def publish_state(self):
+        """
+        Publish what the monitor shows, the publisher only sends what has changed
+        """
+        if self.publisher is None:
+            return
+
+        target = getattr(self, 'target', None)
+
+        self.publisher.publish('target_name', target.name if target is not None else None)
+        self.publisher.publish('current_actions', self.current_step)
+        self.publisher.publish('ready_to_step', self.ready_to_step())
+        self.publisher.publish('auto_mode', self.auto_mode)
+
     def ready(self):
         """
         Return true if we're ready to move to the next step
@@ -206,16 +276,24 @@ class RunManager(RPCAble):
     def _unsafe_update_running(self):
         ########################################################################
         self.task_boundary('scheduler')
-        logger.info("Requesting new target...")
-        try:
-            target, band, requester = self.scheduler.get_next_target()
+        if self.next_target:
+            # Fetched while the last target's cube was taken
+            target, band, requester, mpo = self.next_target
+            self.next_target = None
 
-        except xmlrpclib.Fault, e:
-            # There are no observable targets
-            logger.error(log.sanitize_fault(e.faultString))
-            logger.error(sys.exc_info())
-            self.shutdown()
-            return
+        else:
+            logger.info("Requesting new target...")
+            try:
+                target, band, requester, mpo = self.scheduler.get_next_target()
+                self.in_progress = target, band, requester, mpo
+                self.save_checkpoint()
+
+            except xmlrpclib.Fault, e:
+                # There are no observable targets
+                logger.error(log.sanitize_fault(e.faultString))
+                logger.error(sys.exc_info())
+                self.shutdown()
+                return
 
         self.target = target
 
@@ -225,24 +303,33 @@ class RunManager(RPCAble):
 
         ########################################################################
         self.task_boundary('slew')
-        logger.info("Slewing to target...")
-        try:
-            self.telescope.slew_obs(target)
-        except xmlrpclib.Fault, e:
-            logger.error("Slew Failed")
-            self.skip_target(target)
-            return
+        if self.next_slew:
+            logger.info("Already slewing to target...")
+            start_ra, start_dec, slew_start = self.next_slew
+            self.next_slew = None
+
+        else:
+            logger.info("Slewing to target...")
+            start_ra, start_dec = self.telescope.get_pos()
+            slew_start = time.time()
+            try:
+                self.slew_to(target.ra_deg, target.dec_deg)
+            except xmlrpclib.Fault, e:
+                logger.error("Slew Failed")
+                self.skip_target(target)
+                return
 
-        #self.task_boundary('slider_acq')
+            #self.task_boundary('slider_acq')
 
-        self.slider.to_acquisition()
-        logger.info("Slider to Acquisition Camera...")
-        
-        self.focuser.to_acquisition()
-        logger.info("Focuser to Acquisition Camera...")
+            self.slider.to_acquisition()
+            logger.info("Slider to Acquisition Camera...")
+
+            self.focuser.to_acquisition()
+            logger.info("Focuser to Acquisition Camera...")
         
         self._idle_while_busy(self.telescope, self.slider, self.focuser)
-        time.sleep(5) # Mount settling time
+        settle = self.settle()
+        self.log_move('slew', slew_start, target.ra_deg - start_ra, target.dec_deg - start_dec, settle)
         
 
         ########################################################################
@@ -294,9 +381,11 @@ class RunManager(RPCAble):
         logger.info("   for science camera to be centered on object")
 
         self.task_boundary('slider_sci')
+        move_start = time.time()
         self.focuser.to_science()
         self.slider.to_science()
         self._idle_while_busy(self.focuser, self.slider)
+        self.log_move('instrument', move_start)
 
         # TODO: Do some speckle imaging
         # # Slew telescope by offset
@@ -305,62 +394,247 @@ class RunManager(RPCAble):
         self.task_boundary('autoexpose')
         #self.scicam.autoexpose()
         print "TODO: Autoexposure"
-        time.sleep(15) # TODO: check for scicam.busy, not constant time
         self._idle_while_busy(self.scicam)
 
         if self.scicam.target_in_camera():
             # # Set science camera exposure parameters
 
             self.task_boundary('takedata')
-            # Give the mount/slider time to settle before imaging
-            time.sleep(5)
-            self.scicam.start_acquisition()
+            # Make sure the mount has settled before imaging
+            self.settle()
+            self._finish_target(target, band, requester, mpo)
+
+        else:
+            # The scheduler has usually chosen the next target by now, so get the slider and
+            # focuser back to the acquisition camera without waiting on them.  The slew to
+            # the next target waits for them instead.
+            next_target = self.scheduler.peek_next_target()[0]
+            if next_target:
+                logger.info("Next target should be {target}".format(target=next_target))
+                self.slider.to_acquisition()
+
+            self.focuser.to_acquisition()
+
+    def _finish_target(self, target, band, requester, mpo=1):
+        """
+        Take the science cubes of target and record them
+
+        mpo cubes are taken back to back without reacquiring the target.  If
+        config.burst_recheck is set, the science camera is asked whether the target is still
+        in view between cubes, and the burst ends early if it isn't.  Every cube gets its own
+        Observation, and they are all queued for the run log together.
+
+        In automatic mode the next target is chosen, and the slew to it started, as soon as
+        the cubes are finished, without waiting for them to be logged, and the scheduler works
+        out the next target's reference star while they are taken.  In single step mode the
+        next target waits for the next 'scheduler' step instead.
+        """
+        mpo = max(mpo or 1, 1)
 
-            #self.scicam.start_acquisition()
-            self._idle_while_busy(self.scicam)
+        # A dictionary of Observation columns for each cube that has been taken
+        cubes = []
 
-            filename = self.scicam.get_filename()
-            itime = self.scicam.get_itime()
-            emgain = self.scicam.get_emgain()
-            roi_height, roi_width = self.scicam.get_roi()
+        # Whether a cube has been started but not read yet, and whether the burst has ended
+        # early because the target left the camera
+        burst = {'unread' : False, 'ended' : False}
+
+        def read_cube():
+            # The camera's settings come in one request
+            with self.scicam.batch() as cam:
+                roi = cam.get_roi()
+                filename = cam.get_filename()
+                emgain = cam.get_emgain()
+                itime = cam.get_itime()
+
+            roi_height, roi_width = roi.get()
             ra_deg, dec_deg = self.telescope.get_pos()
-            
+
+            cubes.append({
+                'filename' : filename.get(),
+                'datetime' : datetime.datetime.now(),
+                'emgain' : emgain.get(),
+                'itime' : itime.get(),
+                'roi_width' : roi_width,
+                'roi_height' : roi_height,
+                'ra_deg' : ra_deg,
+                'dec_deg' : dec_deg,
+                })
+
+        def take_cube(n):
+            # Each cube is a step of its own, which reads the cube before it, so the steps that
+            # don't need the camera overlap the whole burst
+            def start():
+                if burst['unread']:
+                    read_cube()
+                    burst['unread'] = False
+
+                    if config.burst_recheck and not self.scicam.target_in_camera():
+                        logger.warning("Target left the science camera, ending burst after {n} cubes".format(n=n))
+                        burst['ended'] = True
+
+                if burst['ended']:
+                    return
+
+                logger.info("Taking cube {n} of {mpo}".format(n=n + 1, mpo=mpo))
+                self.scicam.start_acquisition()
+                burst['unread'] = True
+
+            return start
+
+        def record():
+            if burst['unread']:
+                read_cube()
+
+            # Written in the background, see runlog.RunLogWriter
             if isinstance(target, db.catalog.DoubleStar):
-                obs = Observation(
-                     filename = filename,
-                    star_id = target.id,
-                    datetime = datetime.datetime.now(),
-                    emgain = emgain,
-                    itime = itime,
-                    requester = requester,
-                    roi_width = roi_width,
-                    roi_height = roi_height,
-                    ra_deg = ra_deg,
-                    dec_deg = dec_deg,
-                    band = band
-                    )
-
-                self.session.add(obs)
-                self.session.commit()
-
-                del obs
+                for cube in cubes:
+                    self.runlog.write(dict(star_id=target.id, requester=requester, band=band, **cube))
 
+            for cube in cubes:
+                print "Queued observation for the run log with filename {}".format(cube['filename'])
+
+        def success():
             self.scheduler.target_success()
-                            
-            print "Saved obsevation in run log with filename {}".format(filename)
-           
-        """    
-        if s.lower() == 'y':
-            print "Success!"
-            self.scheduler.target_success()
-        else:
-            print "Failure"
-            self.scheduler.target_failed()
-        """ 
+            self.in_progress = None
+
+        def to_acquisition():
+            self.slider.to_acquisition()
+            self.focuser.to_acquisition()
+
+        def next_target():
+            try:
+                self.next_target = self.scheduler.get_next_target()
+                self.in_progress = self.next_target
+                self.save_checkpoint()
+
+            except xmlrpclib.Fault, e:
+                # Leave it to the next update, which shuts down if there are no targets
+                logger.warning(log.sanitize_fault(e.faultString))
+                return
 
-        self.task_boundary()
-        self.focuser.to_acquisition()
-        self._idle_while_busy(self.focuser)
+            # Failures from here on belong to the next target, which the scheduler now has
+            self.target = self.next_target[0]
+            logger.info("Next target: {target}".format(target=self.target))
+
+        def slew():
+            if not self.next_target:
+                return
+
+            start_ra, start_dec = self.telescope.get_pos()
+            slew_start = time.time()
+            try:
+                self.slew_to(self.next_target[0].ra_deg, self.next_target[0].dec_deg)
+
+            except xmlrpclib.Fault, e:
+                # The next update tries again
+                logger.error("Slew to next target failed")
+                return
+
+            self.next_slew = start_ra, start_dec, slew_start
+
+        # The last cube is 'cube', the ones before it 'cube1', 'cube2'...
+        names = ['cube{0}'.format(n + 1) for n in range(mpo - 1)] + ['cube']
+
+        steps = [Step(name, take_cube(n), after=names[n - 1:n], busy=[self.scicam])
+                 for n, name in enumerate(names)]
+
+        steps += [
+            Step('record', record, after=['cube']),
+            Step('success', success, after=['record']),
+            Step('to_acquisition', to_acquisition, after=['cube'], busy=[self.slider, self.focuser]),
+            ]
+
+        if self.auto_mode:
+            steps += [
+                Step('peek', self.scheduler.peek_next_target),
+                Step('next', next_target, after=['peek', 'success']),
+                Step('slew', slew, after=['next', 'to_acquisition'], busy=[self.telescope]),
+                ]
+
+        sequence = Sequence(self.loop, steps)
+        sequence.run()
+
+        # The steps that followed the cube may have been for the next target
+        self.metrics.finish(target)
+        self.metrics.sequence(steps, target)
+        self.save_checkpoint()
+
+        tonight = night()
+        self.time_saved[tonight] = self.time_saved.get(tonight, 0) + sequence.time_saved()
+
+        logger.info("Overlapping steps saved {saved:.1f}s, {total:.1f}s tonight".format(
+            saved=sequence.time_saved(), total=self.time_saved[tonight]))
+
+    @rpc_method
+    def get_time_saved(self):
+        """
+        Return { night : seconds saved by overlapping steps }, night is the date it began
+        """
+        return self.time_saved
+
+    def settle(self):
+        """
+        Wait for the mount to stop moving, returning how long that took(None if it timed out)
+        """
+        seconds = self.mount_settle.wait()
+        if seconds is not None:
+            logger.info("Mount settled in {seconds:.1f}s".format(seconds=seconds))
+
+        return seconds
+
+    def log_move(self, kind, start, dra=0, ddec=0, settle=None):
+        """
+        Record how long a slew(kind 'slew', by (dra, ddec) degrees) or slider/focuser
+        move(kind 'instrument') that began at the time start took, in config.slew_log.
+        settle is how much of that was spent waiting for the mount to settle.
+
+        These are what scheduler.slewtime.AxisSlewModel is fitted to
+        """
+        try:
+            journal.append(config.slew_log, {
+                'kind' : kind,
+                'datetime' : datetime.datetime.now().isoformat(),
+                'seconds' : time.time() - start,
+                'dra' : periodize(dra),
+                'ddec' : ddec,
+                'settle' : settle,
+                })
+
+        except IOError, e:
+            logger.warning("Could not write to the slew log: " + str(e))
+
+    def checkpoint_state(self):
+        """
+        Return the run manager's state as a JSON serializable dictionary
+        """
+        in_progress = None
+        if self.in_progress:
+            target, band, requester, mpo = self.in_progress
+            in_progress = [target.__class__.__name__, target.id, band, requester, mpo]
+
+        return {
+            'in_progress' : in_progress,
+            'time_saved' : self.time_saved,
+            'acquisition_frames' : self.acquisition_frames,
+            }
+
+    def save_checkpoint(self):
+        checkpoint.save(config.runman_checkpoint, self.checkpoint_state())
+
+    def restore_state(self, state):
+        """
+        Resume from a checkpoint_state(), observing the target that was in progress first
+        """
+        self.time_saved = state['time_saved']
+        self.acquisition_frames = state['acquisition_frames']
+
+        if state['in_progress']:
+            table, i, band, requester, mpo = state['in_progress']
+            target = self.scheduler._lookup(table, i)
+
+            if target is not None:
+                logger.info("Resuming {target}".format(target=target))
+                self.in_progress = self.next_target = target, band, requester, mpo
 
     def startup(self):
         """
@@ -379,6 +653,13 @@ class RunManager(RPCAble):
         """
         logger.info("Shutting down.")
         self.update = self.update_idle
+        self.metrics.finish(getattr(self, 'target', None))
+
+        # Don't leave the night's last observations in the writer's queue
+        self.runlog.flush()
+
+        # Nothing to resume once the night is over
+        checkpoint.clear(config.runman_checkpoint)
         #self.telescope.park()
         
     def skip_target(self, target):
@@ -387,6 +668,38 @@ class RunManager(RPCAble):
         """
         logger.warning("Skipping target {target}.".format(target=target))
         self.scheduler.target_failed()
+        self.in_progress = None
+        self.save_checkpoint()
+
+    def near_known_position(self, ra, dec):
+        """
+        Return true if (ra, dec) is within config.reacquire_radius of where the telescope is
+        known to point
+        """
+        if not self.known_position:
+            return False
+
+        known_ra, known_dec, solved = self.known_position
+        dist = math.hypot(periodize(ra - known_ra) * math.cos(math.radians(dec)), dec - known_dec)
+
+        return dist <= config.reacquire_radius
+
+    def slew_to(self, ra, dec):
+        """
+        Slew to (ra, dec), corrected by the pointing model
+
+        If the telescope was solved nearby, the slew is a blind offset from the solved position
+        instead, which slew_until_within_bounds() only verifies with a short exposure
+        """
+        if self.near_known_position(ra, dec) and self.known_position[2]:
+            known_ra, known_dec, solved = self.known_position
+            logger.info("Blind offset from the last plate solution")
+            self.telescope.slew_rel(*self.pointing.correct_offset(known_ra, known_dec, ra, dec))
+            self.known_position = ra, dec, False
+
+        else:
+            self.telescope.slew_abs(*self.pointing.correct(ra, dec))
+            self.known_position = None
 
     def slew_until_within_bounds(self, ra, dec):
         """
@@ -395,12 +708,36 @@ class RunManager(RPCAble):
         within acceptible pointing error limits defined in config
 
         Returns the final location of the telescope
+
+        Every plate solution is added to the pointing model, and offset slews are corrected
+        by it.  The number of acquisition frames it took is logged.
+
+        If the telescope was solved, or moved blind from a solution, within
+        config.reacquire_radius of (ra, dec), the first frame is only a short
+        config.verify_itime exposure to check the offset.  The full length frames are only
+        taken if that fails.
         """
         self.task_boundary('slew_offset')
         
         # Determine where we're pointing and slew by the difference between than and the target
         # until the target is within (ra_err, dec_err) of the center of the field
         ra_offset_slew = dec_offset_slew = 0
+        frames = 0
+
+        verify = self.near_known_position(ra, dec)
+        if verify:
+            known_ra, known_dec, solved = self.known_position
+
+            if solved:
+                # The telescope hasn't moved since it was solved, so start with the offset
+                ra_deg, dec_deg = known_ra, known_dec
+                ra_offset_slew = ra - ra_deg
+                dec_offset_slew = dec - dec_deg
+
+                if abs(ra_offset_slew) <= config.ra_err and abs(dec_offset_slew) <= config.dec_err:
+                    return ra_deg, dec_deg
+
+        self.known_position = None
         
         outside_target_bounds = True        
         while outside_target_bounds:
@@ -408,15 +745,19 @@ class RunManager(RPCAble):
                 logger.info("Slewing by offset ({ra_deg}, {dec_deg})".format(ra_deg=ra_offset_slew,
                                                                            dec_deg=dec_offset_slew))
 
-                self.telescope.slew_rel(ra_offset_slew, dec_offset_slew)
+                slew_start = time.time()
+                self.telescope.slew_rel(*self.pointing.correct_offset(ra_deg, dec_deg, ra, dec))
                 self._idle_while_busy(self.telescope)
-                time.sleep(10) # Mount settling time
+                settle = self.settle()
+                self.log_move('slew', slew_start, ra_offset_slew, dec_offset_slew, settle)
                 
             logger.info("Calculating current actual position with acquisition camera...")
             self.task_boundary('acq')
-            for x in range(0, config.plate_solve_tries):
+            for x in range(0, 1 if verify else config.plate_solve_tries):
                 logger.info("Taking acquisition image...")
-                self.acquiscam.take_temp_light(config.acquiscam_itime)
+                mount_ra, mount_dec = self.telescope.get_pos()
+                self.acquiscam.take_temp_light(config.verify_itime if verify else config.acquiscam_itime)
+                frames += 1
                 self._idle_while_busy(self.acquiscam)
 
                 imgpath = self.acquiscam.get_img_path()
@@ -439,14 +780,24 @@ class RunManager(RPCAble):
                     break
                             
             else:
+                if verify:
+                    # The short exposure couldn't be solved, so go through the full loop
+                    logger.warning("Could not verify the offset, reacquiring")
+                    verify = False
+                    ra_offset_slew = dec_offset_slew = 0
+                    continue
+
                 # Plate solving failed config.plate_solve_tries times
                 # Skip this target
                 self.skip_target(self.target)
                 return
 
+            verify = False
+
             self.task_boundary('slew_offset')
 
             ra_deg, dec_deg, cam_angle, xsize, ysize = solution
+            self.pointing.add(mount_ra, mount_dec, ra_deg, dec_deg)
 
             # How far the target is from our current position
             ra_offset_slew = ra - ra_deg
@@ -458,5 +809,20 @@ class RunManager(RPCAble):
             logger.debug("Target distance: ({0}, {1})".format(ra_offset_slew, dec_offset_slew))
             
             outside_target_bounds = (abs(ra_offset_slew) > config.ra_err) or (abs(dec_offset_slew) > config.dec_err)
+
+        self.known_position = ra_deg, dec_deg, True
+
+        tonight = self.acquisition_frames.setdefault(night(), [])
+        tonight.append(frames)
+        logger.info("Within bounds after {n} acquisition frames, {mean:.2f} per acquisition tonight".format(
+            n=frames, mean=float(sum(tonight)) / len(tonight)))
+
         return ra_deg, dec_deg
+
+    @rpc_method
+    def get_acquisition_frames(self):
+        """
+        Return { night : [acquisition frames taken to get within bounds, each time] }
+        """
+        return self.acquisition_frames
         
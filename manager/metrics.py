@@ -0,0 +1,82 @@
+import time
+import logging
+import datetime
+
+from ..utils import journal
+
+logger = logging.getLogger(__name__)
+
+def night(when=None):
+    """
+    The night the timestamp when(now by default) belongs to, as the date it began on
+
+    Nights change over at noon, so a whole night has one date
+    """
+    when = time.time() if when is None else when
+
+    return (datetime.datetime.fromtimestamp(when) - datetime.timedelta(hours=12)).date().isoformat()
+
+def target_name(target):
+    return getattr(target, 'name', None) or (str(target) if target is not None else None)
+
+class StepMetrics(object):
+    """
+    Records how long each step of the observing sequence took, in the journal at path
+
+    Every record has the step name, its kind, the target it was for, the night, and its
+    start and end as timestamps.  'boundary' steps are the RunManager's task boundaries,
+    which follow each other, so together they cover the whole night.  'sequence' steps are
+    the steps of a sequencer.Sequence, which can overlap each other.
+
+    tools/overhead_report.py summarizes the journal.
+    """
+    def __init__(self, path):
+        self.path = path
+
+        # The boundary step that is in progress, and when it started
+        self.step = None
+        self.start = None
+
+    def record(self, kind, name, start, end, target=None):
+        try:
+            journal.append(self.path, {
+                'kind' : kind,
+                'step' : name,
+                'target' : target_name(target),
+                'night' : night(start),
+                'start' : start,
+                'end' : end,
+                'seconds' : end - start,
+                })
+
+        except IOError, e:
+            logger.warning("Could not write to the metrics log: " + str(e))
+
+    def boundary(self, name, target=None):
+        """
+        End the step in progress, which was for target, and start the step name
+        """
+        now = time.time()
+        self.finish(target, now)
+
+        self.step = name
+        self.start = now
+
+    def finish(self, target=None, now=None):
+        """
+        End the step in progress, if there is one, without starting another
+        """
+        now = time.time() if now is None else now
+
+        if self.step is not None:
+            self.record('boundary', self.step, self.start, now, target)
+
+        self.step = self.start = None
+
+    def sequence(self, steps, target=None):
+        """
+        Record the sequencer.Steps in steps, which were for target
+        """
+        for step in steps:
+            if step.started is not None and step.finished is not None:
+                self.record('sequence', step.name, step.started, step.finished, target)
@@ -0,0 +1,171 @@
+import os
+import json
+import math
+import logging
+
+import ephem
+import numpy
+
+logger = logging.getLogger(__name__)
+
+def periodize(ang):
+    return (ang + 180) % 360 - 180
+
+class PointingModel(object):
+    """
+    A TPOINT-style pointing model of the mount, fitted to the errors found by plate solving
+
+    The error is the difference between where the mount says it is pointing and where the
+    plate solver says it is, as a sum of the classic terms in hour angle h and declination d,
+    with the site latitude p:
+
+        dh = IH + CH sec(d) + NP tan(d) - MA cos(h) tan(d) + ME sin(h) tan(d) + TF cos(p) sin(h) sec(d)
+        dd = ID + MA sin(h) + ME cos(h) + TF (cos(p) cos(h) sin(d) - sin(p) cos(d))
+
+    IH/ID are index errors, CH collimation, NP non-perpendicular axes, MA/ME polar axis
+    misalignment and TF tube flexure.  The coefficients are refitted by least squares every
+    time a pair is added, from the latest MAX_PAIRS pairs, and saved to path with them, so
+    the model carries over from night to night.
+
+    Everything is in degrees.
+    """
+    TERMS = ('IH', 'ID', 'CH', 'NP', 'MA', 'ME', 'TF')
+
+    # Fewer pairs than this are not fitted, and the model makes no correction
+    MIN_PAIRS = 12
+
+    # Only the latest pairs are fitted, so the model follows changes to the mount
+    MAX_PAIRS = 500
+
+    # Pairs further apart than this(degrees) are assumed to be bad plate solutions
+    MAX_ERROR = 2.
+
+    def __init__(self, lon, lat, path=None):
+        self.site = ephem.Observer()
+        self.site.lon = lon
+        self.site.lat = lat
+
+        self.lat = math.degrees(float(self.site.lat))
+        self.path = path
+
+        self.coeffs = numpy.zeros(len(self.TERMS))
+
+        # [ (ha, dec, dha, ddec) ]
+        self.pairs = []
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def lst(self):
+        """
+        The local sidereal time now, in degrees
+        """
+        self.site.date = ephem.now()
+
+        return math.degrees(float(self.site.sidereal_time()))
+
+    def _design(self, ha, dec):
+        """
+        Return the rows of the least squares problem for dh and dd at (ha, dec), arrays
+        """
+        h = numpy.radians(ha)
+        d = numpy.radians(dec)
+        p = math.radians(self.lat)
+
+        zero = numpy.zeros_like(h)
+        one = numpy.ones_like(h)
+
+        dh = numpy.column_stack([one, zero, 1 / numpy.cos(d), numpy.tan(d),
+                                 -numpy.cos(h) * numpy.tan(d), numpy.sin(h) * numpy.tan(d),
+                                 math.cos(p) * numpy.sin(h) / numpy.cos(d)])
+        dd = numpy.column_stack([zero, one, zero, zero,
+                                 numpy.sin(h), numpy.cos(h),
+                                 math.cos(p) * numpy.cos(h) * numpy.sin(d) - math.sin(p) * numpy.cos(d)])
+
+        return dh, dd
+
+    def error(self, ha, dec):
+        """
+        The predicted pointing error (dha, ddec) of the mount at (ha, dec)
+        """
+        dh, dd = self._design(numpy.array([ha], dtype=float), numpy.array([dec], dtype=float))
+
+        return float(dh.dot(self.coeffs)), float(dd.dot(self.coeffs))
+
+    def correct(self, ra, dec, lst=None):
+        """
+        Return where to point the mount for the sky to be at (ra, dec)
+        """
+        lst = self.lst() if lst is None else lst
+        dha, ddec = self.error(periodize(lst - ra), dec)
+
+        # The sky is at the mount's position plus the error, so take the error off
+        return (ra + dha) % 360, dec - ddec
+
+    def correct_offset(self, from_ra, from_dec, to_ra, to_dec):
+        """
+        Return the relative slew of the mount that moves the sky from (from_ra, from_dec)
+        to (to_ra, to_dec)
+        """
+        lst = self.lst()
+        mount_from = self.correct(from_ra, from_dec, lst)
+        mount_to = self.correct(to_ra, to_dec, lst)
+
+        return periodize(mount_to[0] - mount_from[0]), mount_to[1] - mount_from[1]
+
+    def add(self, mount_ra, mount_dec, solved_ra, solved_dec):
+        """
+        Add a pair of the mount's reported position and the plate solved one, taken now,
+        refit the model and save it
+        """
+        lst = self.lst()
+        mount_ha = periodize(lst - mount_ra)
+        dha = periodize(mount_ra - solved_ra)
+        ddec = solved_dec - mount_dec
+
+        if max(abs(dha), abs(ddec)) > self.MAX_ERROR:
+            logger.warning("Ignoring pointing error of ({dha}, {ddec}), too large".format(dha=dha, ddec=ddec))
+            return
+
+        self.pairs.append((mount_ha, mount_dec, dha, ddec))
+        self.pairs = self.pairs[-self.MAX_PAIRS:]
+
+        self.fit()
+
+        if self.path:
+            try:
+                self.save(self.path)
+
+            except IOError, e:
+                logger.warning("Could not save the pointing model: " + str(e))
+
+    def fit(self):
+        if len(self.pairs) < self.MIN_PAIRS:
+            return
+
+        ha, dec, dha, ddec = numpy.array(self.pairs, dtype=float).T
+        dh, dd = self._design(ha, dec)
+
+        # Weight the hour angle rows by cos(dec), so every pair counts the same on the sky
+        w = numpy.cos(numpy.radians(dec))
+        a = numpy.vstack([dh * w[:, None], dd])
+        b = numpy.concatenate([dha * w, ddec])
+
+        self.coeffs = numpy.linalg.lstsq(a, b)[0]
+
+        rms = math.sqrt(numpy.mean((a.dot(self.coeffs) - b) ** 2)) * 3600
+        logger.info("Fitted pointing model to {n} pairs, {rms:.1f} arcsec rms".format(n=len(self.pairs), rms=rms))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'coeffs' : dict(zip(self.TERMS, self.coeffs.tolist())),
+                       'pairs' : self.pairs}, f)
+
+    def load(self, path):
+        with open(path, 'r') as f:
+            saved = json.load(f)
+
+        self.coeffs = numpy.array([saved['coeffs'].get(term, 0.) for term in self.TERMS])
+        self.pairs = [tuple(p) for p in saved.get('pairs', [])]
+
+        logger.info("Loaded pointing model of {n} pairs from {path}".format(n=len(self.pairs), path=path))
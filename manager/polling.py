@@ -0,0 +1,145 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class DevicePoller(threading.Thread):
+    """
+    Polls one device's ready() from a thread of its own
+
+    The device is only polled while someone is waiting on it(see request()).  Polls start
+    interval seconds apart and back off to max_interval.  As soon as the device reports
+    ready, notify() is called, so the waiter doesn't have to poll anything itself.
+
+    connect() returns a connection to the device for this thread's use only, since an XML-RPC
+    proxy can't be shared between threads.  module is the connection the run manager uses,
+    and identifies the device.
+
+    With a subscription(see utils.pubsub) to the device's published state, the device says
+    when it becomes ready, and the poller checks straight away.  Once the device has published
+    that it isn't ready since the current request, so it will publish becoming ready, it is
+    only polled every fallback seconds, in case that is missed.  Until then it is polled as
+    without a subscription, since a change made and undone between two of the device's
+    checks is never published.
+    """
+    BACKOFF = 1.5
+
+    def __init__(self, name, module, connect, interval, max_interval, notify, subscription=None, fallback=None):
+        super(DevicePoller, self).__init__(name=name)
+        self.daemon = True
+
+        self.module = module
+        self.connect = connect
+        self.interval = interval
+        self.max_interval = max_interval
+        self.notify = notify
+
+        self.subscription = subscription
+        self.fallback = fallback
+        if subscription is not None:
+            subscription.on('ready', self._published)
+
+        self.cond = threading.Condition()
+
+        # Each request() is numbered, and ready_for is the latest one the device was
+        # ready after
+        self.wanted = 0
+        self.ready_for = 0
+
+        # The latest request the subscription has published ready() False during
+        self.unready_for = 0
+
+    def request(self):
+        """
+        Start waiting for the device to be ready, returning a number to pass to is_ready()
+        """
+        with self.cond:
+            self.wanted += 1
+            self.cond.notify()
+
+            return self.wanted
+
+    def is_ready(self, request):
+        return self.ready_for >= request
+
+    def wake(self):
+        """
+        Poll now rather than when the current interval ends
+        """
+        with self.cond:
+            self.cond.notify()
+
+    def _published(self, topic, ready):
+        # Published values can be out of date, so they are checked with a poll
+        if ready:
+            self.wake()
+
+        # None is the subscription losing its connection, which says nothing about the device
+        elif ready is not None:
+            with self.cond:
+                self.unready_for = self.wanted
+
+    def subscribed(self, request):
+        """
+        True if the subscription will publish the device becoming ready for request
+        """
+        return (self.subscription is not None and self.subscription.connected
+                and self.unready_for >= request)
+
+    def run(self):
+        conn = self.connect()
+
+        last = None
+        while True:
+            with self.cond:
+                while self.ready_for >= self.wanted:
+                    self.cond.wait()
+
+                request = self.wanted
+                if request != last:
+                    interval = self.interval
+                    last = request
+
+            start = time.time()
+            try:
+                ready = conn.ready()
+
+            except Exception, e:
+                logger.warning("Polling {mod} failed: {e}".format(mod=self.name, e=e))
+                ready = False
+
+            logger.debug("Polled {mod} in {ms:.0f}ms".format(mod=self.name, ms=(time.time() - start) * 1000))
+
+            with self.cond:
+                if ready:
+                    self.ready_for = request
+
+                else:
+                    self.cond.wait(self.fallback if self.subscribed(request) else interval)
+                    interval = min(interval * self.BACKOFF, self.max_interval)
+
+            if ready:
+                self.notify()
+
+class PolledReadiness(object):
+    """
+    A Readiness(see eventloop) whose polling is done by a DevicePoller
+    """
+    def __init__(self, poller):
+        self.module = poller.module
+        self.poller = poller
+        self.request = poller.request()
+
+        # The loop doesn't need to poll this, the poller wakes it instead
+        self.due = float('inf')
+        self.done = False
+
+    def poll(self, now):
+        # Always cheap, nothing is sent to the device
+        self.done = self.poller.is_ready(self.request)
+
+        return self.done
+
+    def wake(self, now):
+        self.poller.wake()
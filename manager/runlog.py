@@ -0,0 +1,258 @@
+import os
+import time
+import uuid
+import Queue
+import logging
+import datetime
+import threading
+
+from sqlalchemy.exc import SQLAlchemyError, OperationalError, DBAPIError, DisconnectionError
+
+from .. import db
+from ..db.runlog import Observation
+from ..utils import journal
+
+logger = logging.getLogger(__name__)
+
+DATETIME_FORMATS = ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S')
+
+def to_journal(record):
+    """
+    Make an Observation record JSON serializable
+    """
+    record = dict(record)
+    if isinstance(record.get('datetime'), datetime.datetime):
+        record['datetime'] = record['datetime'].isoformat()
+
+    return record
+
+def from_journal(record):
+    record = dict((str(k), v) for k, v in record.items())
+
+    if record.get('datetime'):
+        for fmt in DATETIME_FORMATS:
+            try:
+                record['datetime'] = datetime.datetime.strptime(record['datetime'], fmt)
+                break
+
+            except ValueError:
+                pass
+
+    return record
+
+def unreachable(e):
+    """
+    True if the exception e means the database couldn't be reached, rather than that it
+    refused what was written
+    """
+    if isinstance(e, (OperationalError, DisconnectionError)):
+        return True
+
+    return isinstance(e, DBAPIError) and e.connection_invalidated
+
+class RunLogWriter(threading.Thread):
+    """
+    Writes Observations to the run log from a thread of its own, so a slow database doesn't
+    hold up observing
+
+    write() queues a record(a dictionary of Observation columns) and returns straight away.
+    Records are committed in batches of up to BATCH_SIZE.  If the database can't be reached,
+    the batch is appended to the journal at spool_path instead, and the journal is replayed
+    after the next batch that is written.  If the database refuses a batch for any other
+    reason, its records are written one at a time, and those it refuses are appended to the
+    journal at reject_path, so one bad record doesn't hold up the rest of the night.
+
+    Every record is given a unique record_id when it is queued, and records whose record_id
+    is already in the run log are skipped, so a batch that is written twice(e.g. a commit that
+    succeeded, but whose connection dropped before it said so) is only logged once.
+    """
+    BATCH_SIZE = 50
+
+    # Seconds to wait before trying the database again after it has failed
+    RETRY = 30
+
+    # Seconds flush() waits for the queue to be written by default
+    FLUSH_TIMEOUT = 60
+
+    def __init__(self, spool_path, reject_path):
+        super(RunLogWriter, self).__init__(name='runlog')
+        self.daemon = True
+
+        self.spool_path = spool_path
+        self.reject_path = reject_path
+        self.queue = Queue.Queue()
+
+        # The database can be tried again after this time
+        self.retry_after = 0
+
+    def write(self, record):
+        """
+        Queue the Observation record to be written, returning its record_id
+        """
+        record = dict(record)
+        record.setdefault('record_id', str(uuid.uuid4()))
+        self.queue.put(record)
+
+        return record['record_id']
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """
+        Wait up to timeout seconds until everything queued has been written or spooled,
+        returning whether it has
+        """
+        end = time.time() + timeout
+
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = end - time.time()
+                if remaining <= 0:
+                    logger.error("{n} observations were not written to the run log".format(n=self.queue.unfinished_tasks))
+                    return False
+
+                self.queue.all_tasks_done.wait(remaining)
+
+        return True
+
+    def run(self):
+        while True:
+            try:
+                batch = [self.queue.get(timeout=self.RETRY)]
+
+            except Queue.Empty:
+                # Nothing to write, but the database may be back for the spool
+                if time.time() >= self.retry_after:
+                    self._replay_spool()
+
+                continue
+
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+
+                except Queue.Empty:
+                    break
+
+            try:
+                self._write(batch)
+
+            except Exception, e:
+                # Don't let anything stop the writer
+                logger.error("Lost {n} observations: {e}".format(n=len(batch), e=e))
+
+            finally:
+                for x in batch:
+                    self.queue.task_done()
+
+    def _write(self, batch):
+        if time.time() < self.retry_after:
+            self._spool(batch)
+            return
+
+        try:
+            self._store(batch)
+
+        except SQLAlchemyError, e:
+            logger.error("Could not write to the run log, spooling: " + str(e))
+            self.retry_after = time.time() + self.RETRY
+            self._spool(batch)
+            return
+
+        logger.info("Wrote {n} observations to the run log".format(n=len(batch)))
+
+        # The database is back, so catch up with anything spooled while it wasn't
+        self._replay_spool()
+
+    def _replay_spool(self):
+        if not os.path.exists(self.spool_path):
+            return
+
+        try:
+            self.replay()
+
+        except Exception, e:
+            logger.warning("Could not replay the run log spool: " + str(e))
+            self.retry_after = time.time() + self.RETRY
+
+    def _store(self, records):
+        """
+        Commit records, rejecting any the database refuses
+
+        Raises the error if the database can't be reached, having committed none or some of
+        records.
+        """
+        try:
+            self._insert(records)
+            return
+
+        except Exception, e:
+            if unreachable(e):
+                raise
+
+            logger.warning("The run log refused a batch, writing it one at a time: " + str(e))
+
+        for r in records:
+            try:
+                self._insert([r])
+
+            except Exception, e:
+                if unreachable(e):
+                    raise
+
+                self._reject(r, e)
+
+    def _insert(self, records):
+        """
+        Commit records, skipping any that are already in the run log
+        """
+        session = db.Session()
+        try:
+            ids = [r['record_id'] for r in records]
+            done = set(i for i, in session.query(Observation.record_id).filter(Observation.record_id.in_(ids)))
+
+            for r in records:
+                if r['record_id'] not in done:
+                    session.add(Observation(**r))
+
+            session.commit()
+
+        except:
+            session.rollback()
+            raise
+
+        finally:
+            session.close()
+
+    def _spool(self, records):
+        for r in records:
+            journal.append(self.spool_path, to_journal(r))
+
+        logger.warning("Spooled {n} observations to {path}".format(n=len(records), path=self.spool_path))
+
+    def _reject(self, record, e):
+        logger.error("The run log refused observation {id}, keeping it in {path}: {e}".format(
+            id=record.get('record_id'), path=self.reject_path, e=e))
+
+        journal.append(self.reject_path, to_journal(record))
+
+    def replay(self):
+        """
+        Write the spooled records to the run log, and empty the spool
+        """
+        records = []
+        for r in journal.read(self.spool_path):
+            try:
+                records.append(from_journal(r))
+
+            except Exception, e:
+                logger.error("Unreadable spooled observation, keeping it in {path}: {e}".format(
+                    path=self.reject_path, e=e))
+                journal.append(self.reject_path, r)
+
+        if records:
+            logger.info("Replaying {n} spooled observations".format(n=len(records)))
+
+        for i in range(0, len(records), self.BATCH_SIZE):
+            self._store(records[i:i + self.BATCH_SIZE])
+
+        if os.path.exists(self.spool_path):
+            os.remove(self.spool_path)
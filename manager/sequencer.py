@@ -0,0 +1,105 @@
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Step(object):
+    """
+    One step of a Sequence
+
+    start() begins the step, which is finished once every module in busy is ready.  The step
+    isn't started until every step named in after has finished.
+    """
+    def __init__(self, name, start, after=(), busy=()):
+        self.name = name
+        self.start = start
+        self.after = tuple(after)
+        self.busy = tuple(busy)
+
+        # When the step was started and finished, as timestamps
+        self.started = None
+        self.finished = None
+
+    def duration(self):
+        return self.finished - self.started
+
+    def __repr__(self):
+        return '<(Step) {name}>'.format(name=self.name)
+
+class Sequence(object):
+    """
+    A dependency graph of Steps, run on an EventLoop
+
+    Every step starts as soon as the steps it depends on have finished, so independent steps
+    overlap.  time_saved() is how much sooner the sequence finished than it would have if
+    the steps had been run one after another.
+    """
+    def __init__(self, loop, steps):
+        self.loop = loop
+        self.steps = list(steps)
+
+        names = set(step.name for step in self.steps)
+        for step in self.steps:
+            for name in step.after:
+                if name not in names:
+                    raise ValueError("Step {step} depends on unknown step {name}".format(step=step.name,
+                                                                                        name=name))
+
+        self.elapsed = None
+
+    def run(self):
+        """
+        Run every step, returning once they have all finished
+        """
+        pending = list(self.steps)
+        finished = set()
+
+        # { Step : [Readiness of the modules it is waiting on] }
+        running = {}
+
+        start = time.time()
+        while pending or running:
+            progressed = False
+
+            for step in [s for s in pending if finished.issuperset(s.after)]:
+                logger.debug("Starting step {name}".format(name=step.name))
+                pending.remove(step)
+
+                step.started = time.time()
+                step.start()
+                running[step] = [self.loop.readiness(mod) for mod in step.busy]
+                progressed = True
+
+            now = time.time()
+            for step in running.keys():
+                running[step] = self.loop.poll(running[step], now)
+
+                if not running[step]:
+                    logger.debug("Finished step {name}".format(name=step.name))
+                    del running[step]
+
+                    step.finished = time.time()
+                    finished.add(step.name)
+                    progressed = True
+
+            if progressed:
+                continue
+
+            if not running:
+                raise ValueError("Steps {steps} depend on each other".format(steps=pending))
+
+            self.loop.sleep(sum(running.values(), []))
+
+        self.loop.pending = []
+        self.elapsed = time.time() - start
+
+        return self.elapsed
+
+    def serial_time(self):
+        """
+        How long the steps took altogether, which is how long they would take one at a time
+        """
+        return sum(step.duration() for step in self.steps)
+
+    def time_saved(self):
+        return max(self.serial_time() - self.elapsed, 0)
@@ -0,0 +1,57 @@
+import math
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SettleDetector(object):
+    """
+    Waits for something to stop moving, by sampling its position until it holds still
+
+    sample() returns a position as (ra, dec) in degrees, for example telescope.get_pos().
+    It is settled once samples positions in a row have each moved less than threshold
+    degrees from the one before.  Positions are sampled every interval seconds, and RPC
+    requests are served by loop in between.  After timeout seconds it gives up waiting.
+    """
+    def __init__(self, loop, sample, threshold, interval, samples, timeout):
+        self.loop = loop
+        self.sample = sample
+        self.threshold = threshold
+        self.interval = interval
+        self.samples = samples
+        self.timeout = timeout
+
+    def distance(self, a, b):
+        """
+        How far apart the positions a and b are, in degrees on the sky
+        """
+        dra = (a[0] - b[0] + 180) % 360 - 180
+        ddec = a[1] - b[1]
+
+        return math.hypot(dra * math.cos(math.radians(b[1])), ddec)
+
+    def wait(self):
+        """
+        Return the number of seconds it took to settle, or None if it timed out
+        """
+        start = time.time()
+
+        last = self.sample()
+        still = 0
+        while still < self.samples:
+            if time.time() - start >= self.timeout:
+                logger.warning("Not settled after {timeout}s".format(timeout=self.timeout))
+                return None
+
+            self.loop.pause(self.interval)
+
+            pos = self.sample()
+            moved = self.distance(pos, last)
+            last = pos
+
+            if moved < self.threshold:
+                still += 1
+            else:
+                still = 0
+
+        return time.time() - start
@@ -1 +1 @@
-from scheduler import RandomScheduler, InOrderScheduler, WeightedSingleScheduler
+from scheduler import RandomScheduler, InOrderScheduler, WeightedSingleScheduler, PlannedScheduler
@@ -0,0 +1,132 @@
+import time
+import logging
+
+import numpy
+
+from slewtime import DistanceSlewModel
+
+logger = logging.getLogger(__name__)
+
+def timestamp(dt):
+    """
+    Convert a naive local datetime into seconds since the epoch, as a float
+    """
+    return time.mktime(dt.timetuple()) + (dt.microsecond / 1e6)
+
+class CostEngine(object):
+    """
+    Scores an entire target list in one vectorized pass
+
+    The positions, priorities and last-scheduled times of every target are kept in NumPy
+    arrays, indexed in the same order as self.targets, and last-observed times are looked up
+    from the ObservationHistory as an array.  The sky state(sidereal time, moon
+    position) is computed once by the caller and passed in, so scoring N targets costs a
+    handful of array operations instead of N sets of ephem calls.
+
+    The distance term is the slew_model's prediction of the overhead of moving from the
+    telescope to each target.  With the default DistanceSlewModel the cost expression is
+    identical to WeightedSingleScheduler.cost, term for term, so the two always choose the
+    same target.
+    """
+    def __init__(self, targets, hour_angle_weight, distance_weight, moon_dist_weight, time_delta_weight,
+                 slew_model=None, history=None):
+        self.hour_angle_weight = hour_angle_weight
+        self.distance_weight = distance_weight
+        self.moon_dist_weight = moon_dist_weight
+        self.time_delta_weight = time_delta_weight
+
+        self.slew_model = slew_model or DistanceSlewModel()
+
+        # ObservationHistory, for targets that haven't been scheduled by this process.  It is
+        # kept current by the scheduler, and looked up whenever costs are computed
+        self.history = history
+
+        self.load(targets)
+
+    def load(self, targets):
+        """
+        (Re)build the target arrays from a list of Target objects
+
+        Any last-scheduled times are forgotten
+        """
+        self.targets = list(targets)
+
+        # { target : index into the arrays }
+        self.index = dict((t, i) for i, t in enumerate(self.targets))
+
+        self.ra = numpy.array([t.star.ra_deg for t in self.targets], dtype=float)
+        self.dec = numpy.array([t.star.dec_deg for t in self.targets], dtype=float)
+        self.priority = numpy.array([t.priority if t.priority is not None else 3 for t in self.targets],
+                                    dtype=float)
+
+        # Seconds since the epoch at which each target was last scheduled, NaN if never
+        self.last_time = numpy.empty(len(self.targets))
+        self.last_time.fill(numpy.nan)
+
+        self.star_ids = numpy.array([t.star_id for t in self.targets], dtype=int)
+
+    def mark_scheduled(self, target, when):
+        """
+        Record that target was scheduled at the datetime when
+        """
+        self.last_time[self.index[target]] = timestamp(when)
+
+    def clear_scheduled(self):
+        """
+        Forget all last-scheduled times
+        """
+        self.last_time.fill(numpy.nan)
+
+    def costs(self, tele_ra, tele_dec, lst, moon_ra, moon_dec, now):
+        """
+        Return an array of the cost of every target
+
+        lst, moon_ra and moon_dec are the values ephem reports for the current sidereal
+        time and moon position, now is a datetime
+        """
+        # Hour-angle
+        ha = numpy.abs(self.ra - lst)
+
+        # Overhead of getting there from the current position
+        tele_dist = self.slew_model.seconds(tele_ra, tele_dec, self.ra, self.dec)
+
+        # Seconds since the epoch at which each target's star was last observed, NaN if never
+        # or unknown
+        if self.history:
+            last_observed = self.history.lookup(self.star_ids)
+        else:
+            last_observed = numpy.nan * numpy.ones(len(self.targets))
+
+        # Time since last observation, or since it was last scheduled if that is known
+        last = numpy.where(numpy.isnan(self.last_time), last_observed, self.last_time)
+        elapsed = timestamp(now) - last
+        hours = numpy.zeros(len(self.targets))
+        seen = ~numpy.isnan(elapsed)
+        hours[seen] = 2000. / elapsed[seen]
+
+        # Distance from moon
+        moon_dist = numpy.sqrt((self.ra - moon_ra) ** 2 + (self.dec - moon_dec) ** 2)
+
+        return (tele_dist * self.distance_weight) + \
+               (hours     * self.time_delta_weight) + \
+               (moon_dist * self.moon_dist_weight) + \
+               (ha        * self.hour_angle_weight)
+
+    def near(self, target, ra_dist, dec_dist):
+        """
+        Return a boolean array, true for every target within ra_dist degrees of RA and
+        dec_dist degrees of Dec of target
+        """
+        i = self.index[target]
+
+        return (numpy.abs((self.ra - self.ra[i] + 180.) % 360. - 180.) <= ra_dist) & \
+               (numpy.abs(self.dec - self.dec[i]) <= dec_dist)
+
+    def best(self, tele_ra, tele_dec, lst, moon_ra, moon_dec, now):
+        """
+        Return the target with the lowest cost
+        """
+        if not self.targets:
+            return None
+
+        return self.targets[int(numpy.argmin(self.costs(tele_ra, tele_dec, lst, moon_ra, moon_dec, now)))]
@@ -0,0 +1,158 @@
+import logging
+
+import ephem
+import numpy
+
+from ..utils import astro
+
+logger = logging.getLogger(__name__)
+
+# ephem dates are days since 1899/12/31 12:00 UTC, timestamps are seconds since this
+EPOCH = ephem.Date('1970/1/1')
+
+def to_timestamp(date):
+    """
+    Convert an ephem date to seconds since the epoch
+    """
+    return (float(date) - EPOCH) * 86400.
+
+def to_ephem(ts):
+    """
+    Convert seconds since the epoch to an ephem date
+    """
+    return ephem.Date(EPOCH + (ts / 86400.))
+
+def night_bounds(site, now, horizon='-12'):
+    """
+    Return (dusk, dawn) as timestamps for the night that now(a timestamp) falls in, or the
+    next night if it is day.  The night is when the sun is below horizon(nautical twilight
+    by default).  If it is already night, dusk is now.
+    """
+    obs = ephem.Observer()
+    obs.lon = site.lon
+    obs.lat = site.lat
+    obs.horizon = horizon
+    obs.date = to_ephem(now)
+
+    sun = ephem.Sun()
+    sun.compute(obs)
+
+    if sun.alt < obs.horizon:
+        dusk = now
+    else:
+        dusk = to_timestamp(obs.next_setting(sun, use_center=True))
+
+    obs.date = to_ephem(dusk)
+
+    return dusk, to_timestamp(obs.next_rising(sun, use_center=True))
+
+class NightEphemeris(object):
+    """
+    Tables of the sky over one night, sampled every step seconds from start to end
+
+    The moon's position and phase and the local sidereal time are computed with ephem once
+    per sample when this is created.  set_targets() adds the altitude and airmass of every
+    target at every sample.  Lookups interpolate linearly between samples, so nothing calls
+    ephem after the tables are built.
+
+    Angles from ephem(lst, moon_ra, moon_dec) are in radians, as ephem reports them.
+    Altitudes are in degrees.  Times are seconds since the epoch.
+    """
+    def __init__(self, site, start, end, step=300.):
+        self.site = site
+        self.start = start
+        self.end = max(end, start + step)
+        self.step = step
+
+        self.times = numpy.arange(start, self.end + step, step)
+
+        obs = ephem.Observer()
+        obs.lon = site.lon
+        obs.lat = site.lat
+        moon = ephem.Moon()
+
+        lst = []
+        moon_ra = []
+        moon_dec = []
+        moon_phase = []
+        for ts in self.times:
+            obs.date = to_ephem(ts)
+            moon.compute(obs)
+
+            lst.append(float(obs.sidereal_time()))
+            moon_ra.append(float(moon.a_ra))
+            moon_dec.append(float(moon.a_dec))
+            moon_phase.append(moon.moon_phase)
+
+        # Unwrapped, so interpolating across 0/2pi works
+        self.lst_table = numpy.unwrap(lst)
+        self.moon_ra_table = numpy.unwrap(moon_ra)
+        self.moon_dec_table = numpy.array(moon_dec)
+        self.moon_phase_table = numpy.array(moon_phase)
+
+        self.lat = numpy.degrees(float(site.lat))
+
+        self.alt_table = numpy.empty((0, len(self.times)))
+
+        logger.info("Computed ephemeris of {n} samples.".format(n=len(self.times)))
+
+    def covers(self, ts):
+        """
+        Return true if the timestamp ts falls within the tables
+        """
+        return self.start <= ts <= self.end
+
+    def set_targets(self, ra_deg, dec_deg):
+        """
+        Tabulate the altitude of targets at (ra_deg, dec_deg), arrays in degrees
+
+        Lookups of altitude and airmass return arrays in this order
+        """
+        ra_deg = numpy.asarray(ra_deg, dtype=float)
+        dec_deg = numpy.asarray(dec_deg, dtype=float)
+
+        self.alt_table = astro.altitude(ra_deg[:, None], dec_deg[:, None],
+                                        numpy.degrees(self.lst_table)[None, :], self.lat)
+
+    def _interp(self, table, ts):
+        return numpy.interp(ts, self.times, table)
+
+    def lst(self, ts):
+        return self._interp(self.lst_table, ts) % (2 * numpy.pi)
+
+    def moon_ra(self, ts):
+        return self._interp(self.moon_ra_table, ts) % (2 * numpy.pi)
+
+    def moon_dec(self, ts):
+        return self._interp(self.moon_dec_table, ts)
+
+    def moon_phase(self, ts):
+        return self._interp(self.moon_phase_table, ts)
+
+    def sample(self, ts):
+        """
+        The index of the sample at or before the timestamp(s) ts
+        """
+        return numpy.clip(((numpy.asarray(ts) - self.start) // self.step).astype(int), 0, len(self.times) - 1)
+
+    def altitude(self, ts):
+        """
+        The altitude of every target at the timestamp ts
+        """
+        k = min(int(self.sample(ts)), len(self.times) - 2)
+        frac = min(max((ts - self.times[k]) / self.step, 0.), 1.)
+
+        return self.alt_table[:, k] * (1 - frac) + self.alt_table[:, k + 1] * frac
+
+    def airmass(self, ts):
+        """
+        The airmass of every target at the timestamp ts, infinite below the horizon
+        """
+        alt = self.altitude(ts)
+        airmass = numpy.empty(len(alt))
+        airmass.fill(numpy.inf)
+
+        up = alt > 0
+        airmass[up] = 1. / numpy.sin(numpy.radians(alt[up]))
+
+        return airmass
@@ -0,0 +1,72 @@
+import time
+import logging
+
+import numpy
+from sqlalchemy import func
+
+from ..db.runlog import Observation
+from cost import timestamp
+
+logger = logging.getLogger(__name__)
+
+class ObservationHistory(object):
+    """
+    The time each double star was last observed, from the run log
+
+    The whole run log is summarized with one grouped query(the latest datetime per
+    star_id) when this is created, into a pair of arrays sorted by star id.  After that
+    it is kept current by record() as observations are made, so lookups never touch the
+    database.
+
+    Times are seconds since the epoch, NaN for stars that have never been observed.
+    """
+    def __init__(self, session):
+        rows = session.query(Observation.star_id, func.max(Observation.datetime)).filter(
+            Observation.star_id != None).group_by(Observation.star_id).all()
+
+        rows.sort()
+        self.ids = numpy.array([r[0] for r in rows], dtype=int)
+        self.times = numpy.array([timestamp(r[1]) for r in rows], dtype=float)
+
+        logger.info("Loaded observation history of {n} stars.".format(n=len(rows)))
+
+    def _find(self, star_ids):
+        """
+        Return the positions star_ids have, or would have, in self.ids
+        """
+        return numpy.searchsorted(self.ids, star_ids)
+
+    def lookup(self, star_ids):
+        """
+        Return an array of the last observation time of each star in star_ids
+        """
+        star_ids = numpy.asarray(star_ids, dtype=int)
+
+        if not len(self.ids):
+            return numpy.nan * numpy.ones(len(star_ids))
+
+        pos = numpy.minimum(self._find(star_ids), len(self.ids) - 1)
+
+        return numpy.where(self.ids[pos] == star_ids, self.times[pos], numpy.nan)
+
+    def get(self, star_id, default=None):
+        """
+        Return the last observation time of star_id, or default if it has never been observed
+        """
+        t = self.lookup([star_id])[0]
+
+        return default if numpy.isnan(t) else t
+
+    def record(self, star_id, when=None):
+        """
+        Record that star_id was observed at the timestamp when(now by default)
+        """
+        when = time.time() if when is None else when
+        pos = self._find(star_id)
+
+        if pos < len(self.ids) and self.ids[pos] == star_id:
+            self.times[pos] = max(self.times[pos], when)
+
+        else:
+            self.ids = numpy.insert(self.ids, pos, star_id)
+            self.times = numpy.insert(self.times, pos, when)
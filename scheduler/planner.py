@@ -0,0 +1,320 @@
+import logging
+
+import numpy
+
+from ..db.targetlist import Target
+
+from slewtime import AxisSlewModel
+from ephemeris import NightEphemeris
+
+logger = logging.getLogger(__name__)
+
+class PlanEntry(object):
+    """
+    One target in a night plan, and the time it is predicted to start
+    """
+    __slots__ = ('index', 'time')
+
+    def __init__(self, index, time):
+        # Index into NightPlanner.targets
+        self.index = index
+        self.time = time
+
+class NightPlanner(object):
+    """
+    Builds an ordered observing plan for a whole night
+
+    A greedy pass first picks, from the current position, whichever visible target is
+    cheapest to go to next, where cost is slew time in seconds(from slew_model, see
+    scheduler.slewtime) less a bonus for priority and for being overdue(past maxdt hours
+    since its last observation).  A 2-opt local
+    search then reorders the plan to cut total slew time, keeping only reorderings where
+    every target is still visible and past its mindt when it is reached.  Any time that
+    frees up is filled by extending the plan greedily.
+
+    Serving the plan is O(1), next() just advances a pointer.  When the night doesn't go as
+    predicted, repair() reworks only the part of the plan that has not been observed yet,
+    and only reoptimizes the next REPAIR_WINDOW entries.
+
+    Times are seconds since the epoch.  TARGET_DURATION covers the time on a double and
+    its share of the reference star.
+    """
+    # Targets are only observed above this altitude, in degrees
+    MIN_ALTITUDE = 30.
+
+    # Seconds between visibility samples
+    TIME_STEP = 600.
+
+    # Seconds spent on each target, not counting the slew to it
+    TARGET_DURATION = 300.
+
+    # How many seconds of slew a priority level, and an hour past maxdt, are worth
+    PRIORITY_WEIGHT = 60.
+    OVERDUE_WEIGHT = 60.
+
+    # The most 2-opt passes over the plan
+    MAX_OPT_PASSES = 20
+
+    # How many upcoming entries are reoptimized by repair()
+    REPAIR_WINDOW = 20
+
+    def __init__(self, site, slew_model=None):
+        self.site = site
+        self.slew_model = slew_model or AxisSlewModel()
+
+        self.targets = []
+        self.entries = []
+        self.pointer = 0
+
+        self.start = self.end = 0
+
+    def slew_time(self, ra1, dec1, ra2, dec2):
+        """
+        The predicted slew time in seconds between two positions in degrees
+        Any of the arguments may be arrays
+        """
+        return self.slew_model.seconds(ra1, dec1, ra2, dec2)
+
+    def plan(self, targets, start, end, ra, dec, last_observed):
+        """
+        Build the plan for the night from start to end, starting with the telescope at
+        (ra, dec)
+
+        last_observed is an ObservationHistory, or anything else with a get(star_id, default)
+        method returning the timestamp a DoubleStar was last observed
+        """
+        self.targets = [t for t in targets if t.priority != Target.NEVER]
+        self.start = start
+        self.end = end
+
+        n = len(self.targets)
+        self.ra = numpy.array([t.star.ra_deg for t in self.targets], dtype=float)
+        self.dec = numpy.array([t.star.dec_deg for t in self.targets], dtype=float)
+        self.priority = numpy.array([t.priority if t.priority is not None else Target.NORMAL
+                                     for t in self.targets], dtype=float)
+
+        mindt = numpy.array([t.mindt or 0 for t in self.targets], dtype=float) * 3600
+        maxdt = numpy.array([t.maxdt or 0 for t in self.targets], dtype=float) * 3600
+        last = numpy.array([last_observed.get(t.star_id, numpy.nan) for t in self.targets], dtype=float)
+        never = numpy.isnan(last)
+
+        # The earliest each target may be observed, and when it becomes overdue
+        self.earliest = numpy.where(never, -numpy.inf, last + mindt)
+        self.due = numpy.where(never, start, last + maxdt)
+
+        # visible[i, k] is true if target i is high enough at sample k
+        self.ephemeris = NightEphemeris(self.site, start, end, self.TIME_STEP)
+        self.ephemeris.set_targets(self.ra, self.dec)
+        self.visible = self.ephemeris.alt_table >= self.MIN_ALTITUDE
+
+        self.planned = numpy.zeros(n, dtype=bool)
+        self.entries = []
+        self.pointer = 0
+        self.position = (ra, dec)
+        self.now = start
+
+        self._extend()
+        self._optimize(self.pointer, len(self.entries))
+        self._extend()
+
+        logger.info("Planned {0} of {1} targets for the night.".format(len(self.entries), n))
+
+    def _feasible(self, idx, arrival):
+        """
+        Return a boolean array, true where target idx can be observed starting at arrival
+        """
+        done = arrival + self.TARGET_DURATION
+
+        return (arrival >= self.earliest[idx]) & (done <= self.end) & \
+               self.visible[idx, self.ephemeris.sample(arrival)] & self.visible[idx, self.ephemeris.sample(done)]
+
+    def _tail(self):
+        """
+        Return (time, ra, dec) at the end of the plan
+        """
+        if self.pointer < len(self.entries):
+            last = self.entries[-1]
+            return (last.time + self.TARGET_DURATION, self.ra[last.index], self.dec[last.index])
+
+        return (self.now,) + tuple(self.position)
+
+    def _extend(self):
+        """
+        Greedily append targets to the end of the plan until the night is full
+        """
+        t, ra, dec = self._tail()
+
+        while True:
+            idx = numpy.nonzero(~self.planned)[0]
+            if not len(idx):
+                return
+
+            arrival = t + self.slew_time(ra, dec, self.ra[idx], self.dec[idx])
+            ok = self._feasible(idx, arrival)
+            if not ok.any():
+                return
+
+            idx, arrival = idx[ok], arrival[ok]
+            overdue = numpy.maximum(0, arrival - self.due[idx]) / 3600.
+            score = (arrival - t) - (self.PRIORITY_WEIGHT * self.priority[idx]) - (self.OVERDUE_WEIGHT * overdue)
+
+            best = numpy.argmin(score)
+            i = int(idx[best])
+
+            self.entries.append(PlanEntry(i, float(arrival[best])))
+            self.planned[i] = True
+
+            t, ra, dec = arrival[best] + self.TARGET_DURATION, self.ra[i], self.dec[i]
+
+    def _retime(self, first, last):
+        """
+        Recompute the predicted times of entries[first:last] following on from the entry
+        before them, returning the new times or None if any entry would become infeasible
+        """
+        if first > self.pointer:
+            prev = self.entries[first - 1]
+            t, ra, dec = prev.time + self.TARGET_DURATION, self.ra[prev.index], self.dec[prev.index]
+        else:
+            t, (ra, dec) = self.now, self.position
+
+        times = []
+        for entry in self.entries[first:last]:
+            i = entry.index
+            arrival = t + self.slew_time(ra, dec, self.ra[i], self.dec[i])
+
+            if not self._feasible(numpy.array([i]), numpy.array([arrival]))[0]:
+                return None
+
+            times.append(arrival)
+            t, ra, dec = arrival + self.TARGET_DURATION, self.ra[i], self.dec[i]
+
+        # Entries after last must still be reachable in time
+        if last < len(self.entries):
+            nxt = self.entries[last]
+            arrival = t + self.slew_time(ra, dec, self.ra[nxt.index], self.dec[nxt.index])
+            if arrival > nxt.time:
+                return None
+
+        return times
+
+    def _optimize(self, first, last):
+        """
+        2-opt over entries[first:last], reversing any stretch of the plan that shortens the
+        total slew time and keeps every target feasible
+        """
+        def pos(k):
+            if k < self.pointer or k < 0:
+                return self.position
+            e = self.entries[k]
+            return self.ra[e.index], self.dec[e.index]
+
+        def slew(a, b):
+            return float(self.slew_time(a[0], a[1], b[0], b[1]))
+
+        last = min(last, len(self.entries))
+
+        for x in range(self.MAX_OPT_PASSES):
+            improved = False
+
+            for i in range(first, last - 1):
+                for j in range(i + 1, last):
+                    a = pos(i - 1) if i > self.pointer else self.position
+                    bi, bj = pos(i), pos(j)
+
+                    before = slew(a, bi)
+                    after = slew(a, bj)
+
+                    if j + 1 < last:
+                        c = pos(j + 1)
+                        before += slew(bj, c)
+                        after += slew(bi, c)
+
+                    if after >= before - 1e-6:
+                        continue
+
+                    self.entries[i:j + 1] = self.entries[i:j + 1][::-1]
+                    times = self._retime(first, last)
+
+                    if times is None:
+                        self.entries[i:j + 1] = self.entries[i:j + 1][::-1]
+                        continue
+
+                    for entry, ts in zip(self.entries[first:last], times):
+                        entry.time = ts
+
+                    improved = True
+
+            if not improved:
+                break
+
+    def peek(self):
+        """
+        Return the next plan entry without consuming it, or None if the plan is exhausted
+        """
+        if self.pointer < len(self.entries):
+            return self.entries[self.pointer]
+
+        return None
+
+    def next(self):
+        """
+        Return the next target in the plan, or None if the plan is exhausted
+        """
+        entry = self.peek()
+        if entry is None:
+            return None
+
+        self.pointer += 1
+        self.now = entry.time + self.TARGET_DURATION
+        self.position = (self.ra[entry.index], self.dec[entry.index])
+
+        return self.targets[entry.index]
+
+    def upcoming(self, n):
+        """
+        Return the next n targets in the plan, without consuming them
+        """
+        return [self.targets[e.index] for e in self.entries[self.pointer:self.pointer + n]]
+
+    def take(self, targets):
+        """
+        Remove targets from the unobserved part of the plan, for when they are observed out
+        of order
+        """
+        targets = set(targets)
+
+        self.entries[self.pointer:] = [e for e in self.entries[self.pointer:]
+                                       if self.targets[e.index] not in targets]
+
+    def repair(self, now, ra, dec):
+        """
+        Rework the rest of the plan for the telescope being at (ra, dec) at the time now
+
+        Entries that can no longer be reached while visible are dropped, the next
+        REPAIR_WINDOW entries are reoptimized, and the end of the plan is refilled
+        """
+        self.now = now
+        self.position = (ra, dec)
+
+        t = now
+        kept = []
+        for entry in self.entries[self.pointer:]:
+            i = entry.index
+            arrival = t + self.slew_time(ra, dec, self.ra[i], self.dec[i])
+
+            if self._feasible(numpy.array([i]), numpy.array([arrival]))[0]:
+                entry.time = float(arrival)
+                kept.append(entry)
+                t, ra, dec = arrival + self.TARGET_DURATION, self.ra[i], self.dec[i]
+
+            else:
+                self.planned[i] = False
+
+        dropped = len(self.entries) - self.pointer - len(kept)
+        self.entries[self.pointer:] = kept
+
+        self._optimize(self.pointer, self.pointer + self.REPAIR_WINDOW)
+        self._extend()
+
+        logger.info("Repaired plan, {0} entries dropped, {1} remaining.".format(
+            dropped, len(self.entries) - self.pointer))
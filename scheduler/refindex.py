@@ -0,0 +1,186 @@
+import math
+import logging
+
+import numpy
+from scipy.spatial import cKDTree
+
+from ..db.catalog import ReferenceStar
+from ..utils import astro
+
+logger = logging.getLogger(__name__)
+
+def unit_vectors(ra_deg, dec_deg):
+    """
+    Convert arrays of RA and Dec in degrees into an (N, 3) array of unit vectors
+    """
+    ra = numpy.radians(ra_deg)
+    dec = numpy.radians(dec_deg)
+
+    return numpy.column_stack((numpy.cos(dec) * numpy.cos(ra),
+                               numpy.cos(dec) * numpy.sin(ra),
+                               numpy.sin(dec)))
+
+def ra_diff(ra1, ra2):
+    """
+    The difference ra1 - ra2 in degrees, wrapped into [-180, 180)
+    """
+    return (numpy.asarray(ra1) - ra2 + 180.) % 360. - 180.
+
+class ReferenceStarIndex(object):
+    """
+    An in-memory spatial index over the reference star catalog
+
+    The catalog is read from the database once, and the stars are stored as unit vectors
+    in a KD-tree, so neighbourhood queries handle RA wraparound and the poles without any
+    special cases.  Spectral types are converted to numbers(astro.stype_to_number) up front.
+
+    Queries return arrays of indices into the catalog arrays(self.ids, self.ra, ...), and
+    star() turns an index back into a ReferenceStar.  These ReferenceStars are not attached
+    to a session, they only carry the catalog columns, so no database I/O happens after
+    the index is built.
+    """
+    def __init__(self, session):
+        rows = session.query(ReferenceStar.id,
+                             ReferenceStar.name,
+                             ReferenceStar.ra_deg,
+                             ReferenceStar.dec_deg,
+                             ReferenceStar.magb,
+                             ReferenceStar.magv,
+                             ReferenceStar.stype).filter(
+                                 ReferenceStar.ra_deg != None,
+                                 ReferenceStar.dec_deg != None).all()
+
+        self.ids = numpy.array([r.id for r in rows], dtype=int)
+        self.names = [r.name for r in rows]
+        self.ra = numpy.array([r.ra_deg for r in rows], dtype=float)
+        self.dec = numpy.array([r.dec_deg for r in rows], dtype=float)
+        self.magb = [r.magb for r in rows]
+        self.magv = [r.magv for r in rows]
+        self.stypes = [r.stype for r in rows]
+        self.stype = numpy.array([astro.stype_to_number(s) for s in self.stypes], dtype=int)
+
+        # { database id : index }
+        self.position = dict((i, n) for n, i in enumerate(self.ids))
+
+        self.tree = cKDTree(unit_vectors(self.ra, self.dec)) if len(rows) else None
+
+        logger.info("Indexed {n} reference stars.".format(n=len(rows)))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _excluded(self, idx, exclude):
+        """
+        Remove the indices of stars whose database ids are in exclude
+        """
+        if not exclude or not len(idx):
+            return idx
+
+        return idx[~numpy.in1d(self.ids[idx], list(exclude))]
+
+    def within(self, ra, dec, ra_dist, dec_dist, exclude=()):
+        """
+        Return the indices of all stars within ra_dist degrees of RA and dec_dist degrees of
+        Dec of (ra, dec), skipping any whose database id is in exclude
+        """
+        if self.tree is None:
+            return numpy.array([], dtype=int)
+
+        # A circle of this radius always contains the RA/Dec box, trim it down to the box
+        radius = math.radians(min(math.hypot(ra_dist, dec_dist), 180.))
+        chord = 2 * math.sin(radius / 2)
+
+        idx = numpy.array(self.tree.query_ball_point(unit_vectors([ra], [dec])[0], chord), dtype=int)
+
+        if len(idx):
+            idx = idx[(numpy.abs(ra_diff(self.ra[idx], ra)) <= ra_dist) &
+                      (numpy.abs(self.dec[idx] - dec) <= dec_dist)]
+
+        return self._excluded(idx, exclude)
+
+    def within_all(self, positions, ra_dist, dec_dist, exclude=()):
+        """
+        Return the indices of all stars within ra_dist degrees of RA and dec_dist degrees of
+        Dec of every (ra, dec) in positions, skipping any whose database id is in exclude
+        """
+        (ra, dec), others = positions[0], positions[1:]
+
+        idx = self.within(ra, dec, ra_dist, dec_dist, exclude)
+
+        for ra, dec in others:
+            idx = idx[(numpy.abs(ra_diff(self.ra[idx], ra)) <= ra_dist) &
+                      (numpy.abs(self.dec[idx] - dec) <= dec_dist)]
+
+        return idx
+
+    def nearest(self, ra, dec, k, exclude=()):
+        """
+        Return the indices of the k nearest stars to (ra, dec), nearest first, skipping any whose
+        database id is in exclude
+        """
+        if self.tree is None:
+            return numpy.array([], dtype=int)
+
+        # Ask for enough extra stars that k remain after the excluded ones are dropped
+        dist, idx = self.tree.query(unit_vectors([ra], [dec])[0], k=min(k + len(exclude), len(self)))
+
+        return self._excluded(numpy.atleast_1d(idx), exclude)[:k]
+
+    def ranked(self, ra, dec, stype, ra_dist, dec_dist, n, exclude=()):
+        """
+        Return the indices of the n best reference stars for a double at (ra, dec) with the
+        spectral type number stype, best first
+
+        This follows AbstractScheduler.get_next_single_star: stars within the
+        (ra_dist, dec_dist) box are ranked by spectral type difference, then distance.  If
+        there are fewer than n, the box is doubled and the new stars in it are ranked after
+        the ones already found, and so on.
+        """
+        found = numpy.array([], dtype=int)
+
+        while len(found) < min(n, len(self) - len(exclude)):
+            idx = self.within(ra, dec, ra_dist, dec_dist, exclude)
+            idx = idx[~numpy.in1d(idx, found)]
+
+            if len(idx):
+                spec_diff = numpy.abs(self.stype[idx] - stype)
+                idx = idx[numpy.lexsort((self.dist(idx, ra, dec), spec_diff))]
+                found = numpy.concatenate((found, idx))
+
+            if ra_dist >= 180 and dec_dist >= 180:
+                # The box already covers the whole sky
+                break
+
+            ra_dist = 2 * ra_dist
+            dec_dist = 2 * dec_dist
+
+        return found[:n]
+
+    def dist(self, idx, ra, dec):
+        """
+        The Euclidean distance in degrees(as astro.dist, but wrapping RA) from (ra, dec) to
+        each star in idx
+        """
+        return numpy.sqrt(ra_diff(self.ra[idx], ra) ** 2 + (self.dec[idx] - dec) ** 2)
+
+    def star_by_id(self, star_id):
+        """
+        Return a ReferenceStar for the star with the database id star_id, or None if it
+        is not in the index
+        """
+        if star_id not in self.position:
+            return None
+
+        return self.star(self.position[star_id])
+
+    def star(self, i):
+        """
+        Return a ReferenceStar for the star at index i
+        """
+        return ReferenceStar(id=int(self.ids[i]),
+                             name=self.names[i],
+                             ra_deg=float(self.ra[i]),
+                             dec_deg=float(self.dec[i]),
+                             magb=self.magb[i],
+                             magv=self.magv[i],
+                             stype=self.stypes[i])
@@ -1,4 +1,4 @@
-import functools
+import time
 import logging
 import datetime
 import math
@@ -8,21 +8,32 @@ logger = logging.getLogger(__name__)
 from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
 
 import ephem
+import numpy
 
 from .. import db
-from ..db.catalog import DoubleStar, ReferenceStar
+from .. import config
+from ..db.catalog import DoubleStar, ReferenceStar, RefStarPairing
 from ..db.runlog import Observation
 from ..db.targetlist import Target
 
 from ..utils.xmlrpc import RPCAble, rpc_method
 from ..utils import astro
+from ..utils import checkpoint
 
 import errors
+from cost import CostEngine, timestamp
+import refindex
+from refindex import ReferenceStarIndex
+from planner import NightPlanner
+from ephemeris import NightEphemeris, night_bounds
+from slewtime import load_slew_model
+from history import ObservationHistory
+from snapshot import TargetSnapshot
 
 moon = ephem.Moon()
 site = ephem.Observer()
-site.lon = "120:39:00"
-site.lat = "35:18:03"
+site.lon = config.site_lon
+site.lat = config.site_lat
 
 class AbstractScheduler(RPCAble):
     """
@@ -35,12 +46,33 @@ class AbstractScheduler(RPCAble):
     # The maximum distance a single may be from its double in degrees
     MAX_SINGLE_DIST_RA = 2.0
     MAX_SINGLE_DIST_DEC = 2.0
+
+    # The most doubles that may share one single
+    MAX_GROUP_SIZE = 4
+
+    # The largest spectral type difference(see astro.stype_to_number) allowed between two
+    # doubles that share a single
+    GROUP_STYPE_TOLERANCE = 10
+
+    # Seconds to wait before prefetching again after there were no observable targets
+    PREFETCH_RETRY = 60
     
     def __init__(self):
         super(AbstractScheduler, self).__init__()
 
         print db
         self.session = db.Session()
+
+        # The reference star catalog, held in memory for picking singles
+        self.refstars = ReferenceStarIndex(self.session)
+
+        # When each double was last observed, loaded from the run log once and then kept
+        # current by target_success
+        self.history = ObservationHistory(self.session)
+
+        # The target list with the star columns needed for scheduling, loaded in one query
+        # Subclasses refresh() this to pick up changes to the target list
+        self.snapshot = TargetSnapshot(self.session)
         
         # The list of doubles that are currently scheduled
         # They are observed in the order contained in this list
@@ -79,17 +111,28 @@ class AbstractScheduler(RPCAble):
         # the reference star id. 
         self.successful_single_observation = None
 
+        # The next group, computed by update() ahead of time while the current group is
+        # being observed, as (double_queue, single)
+        # The single is None if it needs to be chosen again
+        self.prefetched_group = None
+
+        # The time after which update() may try to prefetch again, after finding nothing
+        self.prefetch_retry = 0
+
+        # The state above is saved here whenever it changes, see save_checkpoint()
+        self.checkpoint_path = config.scheduler_checkpoint
+
     def _get_next_target(self):
         """
         Fetch and return the next target to observe, as a (SQLAlchemy ORM object,
-        band) tuple
+        band, requester, mpo) tuple
         """
         if self.double_queue: # If there are still doubles in the queue
             self.current = self.double_queue.pop(0)
 
         elif self.single and self.successful_doubles: 
             # If we have a single ready to go, and we observed at least one double
-            self.current = self.single, None, None # None = placeholders for band, requester
+            self.current = self.single, None, None, 1 # None = placeholders for band, requester
             self.single = None
 
         else: # We're out of singles and doubles
@@ -104,12 +147,47 @@ class AbstractScheduler(RPCAble):
         Return the next target to observe and the band as an RPC-serializable string, to be converted into
         an SQLAlchemy ORM object at the client side
         """
-        double, band, requester = self._get_next_target()
+        double, band, requester, mpo = self._get_next_target()
+        self.save_checkpoint()
         
         db = double.__class__.__name__
         i = double.id
         
-        return (db, i, band, requester)
+        return (db, i, band, requester, mpo)
+
+    def _peek_next_target(self):
+        """
+        Return what _get_next_target will return next, assuming the current target is a
+        success, without changing any state other than prefetching the next group
+        """
+        if self.double_queue:
+            return self.double_queue[0]
+
+        current_ok = self.current is not None and isinstance(self.current[0], DoubleStar)
+        if self.single and (self.successful_doubles or current_ok):
+            return self.single, None, None, 1
+
+        self._prefetch()
+
+        return self.prefetched_group[0][0]
+
+    @rpc_method
+    def peek_next_target(self):
+        """
+        Return what get_next_target will return next, in the same form, if the current target
+        is a success.  This does not consume the target.
+
+        If the current target fails, or there are no observable targets, this may be wrong,
+        so it is only a hint(e.g. for getting instruments ready).  Returns None if there are
+        no observable targets.
+        """
+        try:
+            double, band, requester, mpo = self._peek_next_target()
+
+        except errors.NoObservableTargetsError:
+            return None
+
+        return (double.__class__.__name__, double.id, band, requester, mpo)
         
     @rpc_method
     def target_failed(self):
@@ -125,6 +203,13 @@ class AbstractScheduler(RPCAble):
             self.blacklisted_singles.append(self.current[0])
             self.single = self.get_next_single_star(self.successful_doubles)
 
+            # The prefetched group can't use the blacklisted single either
+            prefetched_single = self.prefetched_group and self.prefetched_group[1]
+            if prefetched_single and prefetched_single.id == self.current[0].id:
+                self.prefetched_group = (self.prefetched_group[0], None)
+
+        self.save_checkpoint()
+
     @rpc_method
     def target_success(self):
         """
@@ -135,8 +220,11 @@ class AbstractScheduler(RPCAble):
         """
         if isinstance(self.current[0], DoubleStar):
             self.successful_doubles.append(self.current)
+            self.history.record(self.current[0].id)
             #self.successful_observations.extend(observation_ids)
 
+        self.save_checkpoint()
+
         '''
         elif isinstance(self.current[0], ReferenceStar):
             print observation_ids
@@ -170,8 +258,22 @@ class AbstractScheduler(RPCAble):
         self.successful_observations = []
         self.successful_single_obs = None
         self.successful_doubles = []
-        self.double_queue = self.get_next_double_group()
-        self.single = self.get_next_single_star(self.double_queue)
+
+        self._prefetch()
+        self.double_queue, self.single = self.prefetched_group
+        self.prefetched_group = None
+
+        if self.single is None:
+            self.single = self.get_next_single_star(self.double_queue)
+
+    def _prefetch(self):
+        """
+        Choose the next group, if it hasn't been already, and store it in
+        self.prefetched_group for _load_next_group
+        """
+        if self.prefetched_group is None:
+            doubles = self.get_next_double_group()
+            self.prefetched_group = (doubles, self.get_next_single_star(doubles))
 
     def _get_next_target_group(self):
         """
@@ -183,52 +285,110 @@ class AbstractScheduler(RPCAble):
 
     def update(self):
         """
+        Called between RPC requests
+
+        Once the last double of a group has been handed out, the next group is chosen here,
+        while the current targets are being observed, so get_next_target doesn't have to
+        wait for it
+        """
+        if not self.double_queue and self.prefetched_group is None and time.time() > self.prefetch_retry:
+            try:
+                self._prefetch()
+
+            except errors.NoObservableTargetsError:
+                # get_next_target will report this when it is called, don't keep trying
+                self.prefetch_retry = time.time() + self.PREFETCH_RETRY
+
+    def _grow_group(self, seed, candidates):
         """
-        pass
+        Build a group of targets around the target seed that can all share one single
+
+        candidates is a list of targets in order of preference.  Each one is added to the
+        group if it is within twice the single distance limits and GROUP_STYPE_TOLERANCE of
+        every target already in the group, and a non-blacklisted single within the limits of
+        the whole group exists, until the group has MAX_GROUP_SIZE targets.
+
+        Returns the group as a list, starting with seed
+        """
+        group = [seed]
+        stypes = [astro.stype_to_number(seed.star.stype)]
+        blacklist = set(s.id for s in self.blacklisted_singles)
+
+        for target in candidates:
+            if len(group) >= self.MAX_GROUP_SIZE:
+                break
+
+            if target is seed:
+                continue
+
+            star = target.star
+            stype = astro.stype_to_number(star.stype)
+
+            if any(abs(stype - s) > self.GROUP_STYPE_TOLERANCE for s in stypes):
+                continue
+
+            if any(abs(refindex.ra_diff(star.ra_deg, t.star.ra_deg)) > 2 * self.MAX_SINGLE_DIST_RA or
+                   abs(star.dec_deg - t.star.dec_deg) > 2 * self.MAX_SINGLE_DIST_DEC
+                   for t in group):
+                continue
+
+            positions = [(t.star.ra_deg, t.star.dec_deg) for t in group + [target]]
+            if not len(self.refstars.within_all(positions, self.MAX_SINGLE_DIST_RA,
+                                                self.MAX_SINGLE_DIST_DEC, exclude=blacklist)):
+                continue
+
+            group.append(target)
+            stypes.append(stype)
+
+        return group
         
     def get_next_double_group(self):
         """
         Call _get_next_target_group, extract all DoubleStars, the band to
-        observe them in, and the requester from the Target objects, 
-        and return a new list, preserving order
+        observe them in, the requester and the number of cubes to take(mpo) from the
+        Target objects, and return a new list, preserving order
 
         # We do this to avoid using Target objects outside this class
         # We avoid doing that because it gets complicated when ReferenceStars don't have
         # corresponding target objects
         """
-        return [(x.star, x.band, x.requester) for x in self._get_next_target_group()]
+        return [(x.star, x.band, x.requester, x.mpo or 1) for x in self._get_next_target_group()]
         
     def get_next_single_star(self, doubles, ra_dist=0, dec_dist=0):
-        if len(doubles) != 1:
-            logger.critical("Finding a single star for a non-1 set of doubles is not currently supported.")
-            raise NotImplementedError
+        """
+        Return the reference star to observe for the group doubles, a list of
+        (double, band, requester, mpo) tuples
 
+        The single must be within (ra_dist, dec_dist) of every double in the group.  Among
+        those, the one whose worst spectral type difference to the doubles is smallest is
+        chosen, then the one whose farthest double is closest.
+        """
         if ra_dist == 0:
             ra_dist = self.MAX_SINGLE_DIST_RA
 
         if dec_dist == 0:
             dec_dist = self.MAX_SINGLE_DIST_DEC
 
-        dbl, band, _ = doubles[0]
-        ra_range = (dbl.ra_deg - ra_dist, dbl.ra_deg + ra_dist)
-        dec_range = (dbl.dec_deg - dec_dist, dbl.dec_deg + dec_dist)
+        dbls = [d[0] for d in doubles]
+        blacklist = set(s.id for s in self.blacklisted_singles)
 
-        # Get all singles that are close enough to the double to be a reference
-        singles = self.session.query(ReferenceStar).filter(
-            ReferenceStar.ra_deg >= ra_range[0],
-            ReferenceStar.ra_deg <= ra_range[1],
-            ReferenceStar.dec_deg >= dec_range[0],
-            ReferenceStar.dec_deg <= dec_range[1]).all()
+        # Use the precomputed pairing if there is one, see tools/build_refstar_pairs.py
+        if len(dbls) == 1 and (ra_dist, dec_dist) == (self.MAX_SINGLE_DIST_RA, self.MAX_SINGLE_DIST_DEC):
+            single = self.get_paired_single_star(dbls[0], blacklist)
+            if single:
+                return single
 
-        # Remove all blacklisted singles
-        singles = filter(lambda s: s not in self.blacklisted_singles, singles)
+        # Get all singles that are close enough to every double to be a reference, other than
+        # the blacklisted ones
+        singles = self.refstars.within_all([(d.ra_deg, d.dec_deg) for d in dbls],
+                                           ra_dist, dec_dist, exclude=blacklist)
 
         if len(singles) == 0:
             # If we couldn't find any single stars close enough, widen the search
             logger.warning("No single stars were found within {ra} degrees RA and {dec} degrees Dec of double star {dbl}.".format(
                 ra=ra_dist,
                 dec=dec_dist,
-                dbl=dbl.name))
+                dbl=', '.join(d.name for d in dbls)))
 
             ra_dist = 2 * ra_dist
             dec_dist = 2 * dec_dist
@@ -243,20 +403,35 @@ class AbstractScheduler(RPCAble):
         # Now that we have some singles to pick from, pick the one with the most similar spectral
         # type
 
-        # Find the minimum spectral type difference between the double and a single
-        spec_diff =  min(abs(astro.stype_to_number(dbl.stype) - astro.stype_to_number(s.stype))
-                     for s in singles)
-
-        # Find all single stars with that minimum spectral type difference
-        singles = filter(lambda s: abs(astro.stype_to_number(dbl.stype) - astro.stype_to_number(s.stype)) == spec_diff, singles)
+        # Find all single stars with the minimum spectral type difference
+        spec_diff = numpy.max([numpy.abs(self.refstars.stype[singles] - astro.stype_to_number(d.stype))
+                               for d in dbls], axis=0)
+        singles = singles[spec_diff == spec_diff.min()]
 
         # Then find the single among those of the most similar spectral 
-        # type that is closest to the double
-        single = min(singles, key=functools.partial(astro.dist, dbl))
+        # type that is closest to the doubles
+        dist = numpy.max([self.refstars.dist(singles, d.ra_deg, d.dec_deg) for d in dbls], axis=0)
+        single = self.refstars.star(singles[numpy.argmin(dist)])
 
         return single
         # TODO: In what band do we observe the single?
 
+    def get_paired_single_star(self, dbl, blacklist):
+        """
+        Return the best ranked reference star for dbl from the refstar_pairs table that is
+        not in blacklist(a set of ReferenceStar ids), or None if there isn't one
+        """
+        ranked = self.session.query(RefStarPairing.refstar_id).filter(
+            RefStarPairing.double_id == dbl.id).order_by(RefStarPairing.rank).all()
+
+        for refstar_id, in ranked:
+            # Stars that have left the catalog since the table was built are skipped too
+            single = self.refstars.star_by_id(refstar_id) if refstar_id not in blacklist else None
+            if single:
+                return single
+
+        return None
+
     @rpc_method
     def reset(self):
         """
@@ -265,6 +440,110 @@ class AbstractScheduler(RPCAble):
         This does not modify the database in any way
         """
         logger.info("Resetting...")
+        self.double_queue = []
+        self.successful_doubles = []
+        self.single = None
+        self.current = None
+        self.blacklisted_singles = []
+        self.prefetched_group = None
+        self.prefetch_retry = 0
+
+        self.save_checkpoint()
+
+    def _encode(self, entry):
+        """
+        Return a (star, band, requester, mpo) tuple as a JSON serializable list
+        """
+        star = entry[0]
+
+        return [star.__class__.__name__, star.id] + list(entry[1:])
+
+    def _decode(self, entry):
+        """
+        The opposite of _encode, returns None if the star no longer exists
+        """
+        table, star_id = entry[:2]
+
+        if table == 'ReferenceStar':
+            star = self.refstars.star_by_id(star_id)
+
+        else:
+            stars = dict((t.star_id, t.star) for t in self.snapshot.targets)
+            star = stars.get(star_id) or self.session.query(DoubleStar).get(star_id)
+
+        if star is None:
+            logger.warning("{table} {id} in the checkpoint no longer exists".format(table=table, id=star_id))
+            return None
+
+        return (star,) + tuple(entry[2:])
+
+    def checkpoint_state(self):
+        """
+        Return the state of the current group as a JSON serializable dictionary
+
+        Subclasses with more state to keep add it to this
+        """
+        return {
+            'double_queue' : [self._encode(e) for e in self.double_queue],
+            'successful_doubles' : [self._encode(e) for e in self.successful_doubles],
+            'single' : self.single.id if self.single else None,
+            'current' : self._encode(self.current) if self.current else None,
+            'blacklisted_singles' : [s.id for s in self.blacklisted_singles],
+            'prefetched_group' : self._encode_group(self.prefetched_group),
+            }
+
+    def _encode_group(self, group):
+        """
+        Return a (double_queue, single) group as JSON serializable, or None if there isn't one
+        """
+        if group is None:
+            return None
+
+        doubles, single = group
+
+        return [[self._encode(e) for e in doubles], single.id if single else None]
+
+    def _decode_group(self, group):
+        """
+        The opposite of _encode_group, returns None if none of the doubles still exist
+        """
+        if group is None:
+            return None
+
+        doubles = filter(None, [self._decode(e) for e in group[0]])
+        if not doubles:
+            return None
+
+        return (doubles, self.refstars.star_by_id(group[1]) if group[1] else None)
+
+    def restore_state(self, state):
+        """
+        The opposite of checkpoint_state
+        """
+        self.double_queue = filter(None, [self._decode(e) for e in state['double_queue']])
+        self.successful_doubles = filter(None, [self._decode(e) for e in state['successful_doubles']])
+        self.single = self.refstars.star_by_id(state['single']) if state['single'] else None
+        self.current = self._decode(state['current']) if state['current'] else None
+        self.blacklisted_singles = filter(None, [self.refstars.star_by_id(i) for i in state['blacklisted_singles']])
+        self.prefetched_group = self._decode_group(state.get('prefetched_group'))
+
+    def save_checkpoint(self):
+        checkpoint.save(self.checkpoint_path, self.checkpoint_state())
+
+    def restore_checkpoint(self):
+        """
+        Resume the group that was being observed when the checkpoint was saved
+
+        Returns True if there was a checkpoint to restore
+        """
+        state = checkpoint.load(self.checkpoint_path)
+        if state is None:
+            return False
+
+        self.restore_state(state)
+        logger.info("Restored {n} doubles from the checkpoint".format(n=len(self.double_queue)))
+
+        return True
         
 #### SPLIT FILE HERE
         
@@ -300,20 +579,109 @@ class InOrderScheduler(AbstractScheduler):
     def __init__(self):
         super(InOrderScheduler, self).__init__()
 
-        self.targets = self.session.query(Target).all()
+        self.targets = list(self.snapshot.targets)
         print 'targets', self.targets
         
     def _get_next_target_group(self):
         if self.targets:
-            return [self.targets.pop(0)]
+            group = self._grow_group(self.targets[0], self.targets)
+            for target in group:
+                self.targets.remove(target)
+
+            return group
 
         raise errors.NoObservableTargetsError("There are no observable targets.")
 
     @rpc_method
     def reset(self):
-        self.targets = self.session.query(Target).all()
+        self.snapshot.refresh()
+        self.targets = list(self.snapshot.targets)
         super(InOrderScheduler, self).reset()
 
+    def checkpoint_state(self):
+        state = super(InOrderScheduler, self).checkpoint_state()
+        state['targets'] = [t.id for t in self.targets]
+
+        return state
+
+    def restore_state(self, state):
+        super(InOrderScheduler, self).restore_state(state)
+        self.targets = [self.snapshot.by_id[i] for i in state['targets'] if i in self.snapshot.by_id]
+
+class PlannedScheduler(AbstractScheduler):
+    """
+    This scheduler plans the whole night at dusk(see NightPlanner), then observes the plan
+    in order, repairing it when targets fail or the night falls behind or gets ahead
+
+    Nothing is handed out before the planned night starts, and no entry is handed out much
+    earlier than planned, since its visibility and mindt were only checked at its planned time
+    """
+    # How far behind or ahead of the plan(seconds) the night may be before the plan is repaired
+    DRIFT_TOLERANCE = 600
+
+    # How many upcoming plan entries are considered for sharing a single with the next one
+    GROUP_LOOKAHEAD = 10
+
+    def __init__(self, telescope):
+        super(PlannedScheduler, self).__init__()
+
+        self.targets = self.snapshot.targets
+        self.telescope = telescope
+
+        self.planner = NightPlanner(site, load_slew_model(config.slew_model))
+
+    def _plan(self, now):
+        dusk, dawn = night_bounds(site, now)
+        ra, dec = self.telescope.get_pos()
+
+        self.planner.plan(self.targets, dusk, dawn, ra, dec, self.history)
+
+    def _get_next_target_group(self):
+        now = time.time()
+
+        # Plan a new night, or try to extend a plan that has run out
+        if now >= self.planner.end or self.planner.peek() is None:
+            self._plan(now)
+
+        if now < self.planner.start:
+            raise errors.NoObservableTargetsError("The night starts in {0:.0f} seconds.".format(self.planner.start - now))
+
+        entry = self.planner.peek()
+        if entry and abs(now - entry.time) > self.DRIFT_TOLERANCE:
+            if now > entry.time:
+                logger.warning("Running {0:.0f} seconds behind plan, repairing.".format(now - entry.time))
+
+            else:
+                logger.warning("Running {0:.0f} seconds ahead of plan, repairing.".format(entry.time - now))
+
+            self.planner.repair(now, *self.telescope.get_pos())
+
+        target = self.planner.next()
+        if target is None:
+            raise errors.NoObservableTargetsError("There are no observable targets.")
+
+        group = self._grow_group(target, self.planner.upcoming(self.GROUP_LOOKAHEAD))
+        self.planner.take(group[1:])
+
+        return group
+
+    @rpc_method
+    def target_failed(self):
+        double = self.current[0]
+
+        if isinstance(double, DoubleStar) and self.planner.peek():
+            # The failed target took less time than planned, pull the rest of the plan in
+            self.planner.repair(time.time(), double.ra_deg, double.dec_deg)
+
+        super(PlannedScheduler, self).target_failed()
+
+    @rpc_method
+    def reset(self):
+        self.snapshot.refresh()
+        self.targets = self.snapshot.targets
+        self.planner = NightPlanner(site, self.planner.slew_model)
+        super(PlannedScheduler, self).reset()
+
 class WeightedSingleScheduler(AbstractScheduler):
     HOUR_ANGLE_WEIGHT = 1
     DISTANCE_WEIGHT = 10
@@ -321,11 +689,17 @@ class WeightedSingleScheduler(AbstractScheduler):
     TIME_DELTA_WEIGHT = 15
 
     CLOSEST_MOON_DIST = 5 #degrees
+
+    # Targets lower than this(degrees) are not scheduled
+    MIN_ALTITUDE = 30
+
+    # Seconds between samples of the ephemeris tables
+    EPHEMERIS_STEP = 300
     
     def __init__(self, telescope):
         super(WeightedSingleScheduler, self).__init__()        
 
-        self.targets = self.session.query(Target).all()
+        self.targets = self.snapshot.targets
 
         print self.targets
 
@@ -341,23 +715,103 @@ class WeightedSingleScheduler(AbstractScheduler):
         # { target : datetime }
         self.scheduled_time = {}
 
+        # Scores the whole target list at once, see cost() for the per-target equivalent
+        # If a slew time model has been fitted, the distance term is the predicted overhead
+        # in seconds rather than degrees
+        self.engine = CostEngine(self.targets,
+                                 self.HOUR_ANGLE_WEIGHT,
+                                 self.DISTANCE_WEIGHT,
+                                 self.MOON_DIST_WEIGHT,
+                                 self.TIME_DELTA_WEIGHT,
+                                 load_slew_model(config.slew_model),
+                                 self.history)
+
+        # Moon, sidereal time and target altitudes for tonight, built on first use
+        self.ephemeris = None
+
+    def _get_ephemeris(self, now):
+        """
+        Return the ephemeris covering the timestamp now, computing tonight's if needed
+        """
+        if self.ephemeris is None or not self.ephemeris.covers(now):
+            dusk, dawn = night_bounds(site, now)
+            self.ephemeris = NightEphemeris(site, min(now, dusk), dawn, self.EPHEMERIS_STEP)
+            self.ephemeris.set_targets(self.engine.ra, self.engine.dec)
+
+        return self.ephemeris
+
     def _get_next_target_group(self):
         self.tele_ra, self.tele_dec = self.telescope.get_pos()
-    
-        target = min(self.targets, key=self.cost)
 
-        self.scheduled_time[target] = datetime.datetime.now()
+        # The sky is read from tables, not computed for every group
+        now = datetime.datetime.now()
+        ts = time.time()
+        eph = self._get_ephemeris(ts)
+
+        if not self.engine.targets:
+            raise errors.NoObservableTargetsError("There are no observable targets.")
+
+        costs = self.engine.costs(self.tele_ra, self.tele_dec,
+                                  eph.lst(ts), eph.moon_ra(ts), eph.moon_dec(ts),
+                                  now)
+
+        visible = eph.altitude(ts) >= self.MIN_ALTITUDE
+        if not visible.any():
+            raise errors.NoObservableTargetsError("No targets are above {alt} degrees.".format(alt=self.MIN_ALTITUDE))
+
+        costs[~visible] = numpy.inf
+
+        # The cheapest target leads the group, and only targets near it can share its single
+        order = numpy.argsort(costs, kind='mergesort')
+        target = self.engine.targets[order[0]]
+        near = self.engine.near(target, 2 * self.MAX_SINGLE_DIST_RA, 2 * self.MAX_SINGLE_DIST_DEC) & visible
+
+        group = self._grow_group(target, [self.engine.targets[i] for i in order if near[i]])
+
+        for target in group:
+            self.scheduled_time[target] = now
+            self.engine.mark_scheduled(target, now)
         
-        return [target]
+        return group
 
     @rpc_method
     def reset(self):
         self.scheduled_time = {}
 
+        if self.snapshot.refresh():
+            self.targets = self.snapshot.targets
+            self.engine.load(self.targets)
+
+            if self.ephemeris is not None:
+                self.ephemeris.set_targets(self.engine.ra, self.engine.dec)
+        else:
+            self.engine.clear_scheduled()
+        super(WeightedSingleScheduler, self).reset()
+
+    def checkpoint_state(self):
+        state = super(WeightedSingleScheduler, self).checkpoint_state()
+        state['scheduled_time'] = [(t.id, timestamp(when)) for t, when in self.scheduled_time.items()]
+
+        return state
+
+    def restore_state(self, state):
+        super(WeightedSingleScheduler, self).restore_state(state)
+
+        for i, ts in state['scheduled_time']:
+            if i in self.snapshot.by_id:
+                target = self.snapshot.by_id[i]
+                when = datetime.datetime.fromtimestamp(ts)
+
+                self.scheduled_time[target] = when
+                self.engine.mark_scheduled(target, when)
+
     def cost(self, target):
         """
         Calculate the cost of a target
         The target with the lowest cost within horizon limits is chosen
+
+        This is the scalar reference for CostEngine.costs, which is what is actually used
+        to pick targets
         """
         # Set this to a very high number to make a target excluded
         # e.g. below horizon or too close to moon
@@ -372,12 +826,11 @@ class WeightedSingleScheduler(AbstractScheduler):
 
         # Time since last observation
         last_obs_time = self.scheduled_time.get(target, None)
-        if not last_obs_time:
-            #last_obs_time =  self.session.query(Observation).filter_by(star_id=target.star_id).order_by("datetime").all()
-            last_obs_time = []
+        if not last_obs_time and self.history:
+            last_obs_time = self.history.get(target.star_id)
 
             if last_obs_time:
-                last_obs_time = last_obs_time[0].datetime
+                last_obs_time = datetime.datetime.fromtimestamp(last_obs_time)
                 
         if last_obs_time:
             hours = 2000. / (((datetime.datetime.now() - last_obs_time).total_seconds()))
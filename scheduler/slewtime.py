@@ -0,0 +1,140 @@
+import json
+import logging
+import os.path
+
+import numpy
+
+logger = logging.getLogger(__name__)
+
+def _ra_diff(ra1, ra2):
+    return (numpy.asarray(ra2, dtype=float) - ra1 + 180.) % 360. - 180.
+
+class SlewTimeModel(object):
+    """
+    Predicts the overhead of moving the telescope from one target to another
+
+    Subclasses implement seconds().  All of the position arguments may be NumPy arrays, so a
+    whole target list can be costed at once.
+    """
+    def seconds(self, ra1, dec1, ra2, dec2):
+        """
+        Return the predicted overhead of moving from (ra1, dec1) to (ra2, dec2), in seconds
+        """
+        raise NotImplementedError
+
+class DistanceSlewModel(SlewTimeModel):
+    """
+    The Euclidean RA/Dec distance in degrees, standing in for time
+
+    This is what the scheduler used before there were fitted models, and is still used when
+    no fitted model is available.  Note that it does not wrap RA.
+    """
+    def seconds(self, ra1, dec1, ra2, dec2):
+        return numpy.sqrt((numpy.asarray(ra2) - ra1) ** 2 + (numpy.asarray(dec2) - dec1) ** 2)
+
+class AxisSlewModel(SlewTimeModel):
+    """
+    A per-axis mount slew model, plus settle and instrument overheads
+
+    Each axis accelerates at accel degrees/s^2 up to its top speed(ra_speed, dec_speed in
+    degrees/s), then decelerates, and the slew is done when the slower axis is.  settle
+    covers everything between the mount stopping and the first exposure(the settle waits
+    in the run manager), and instrument is the slider and focuser moves each target needs
+    that can't overlap the slew.
+
+    Parameters are fitted by fit() from the slew log the run manager keeps(config.slew_log).
+    """
+    PARAMS = ('ra_speed', 'dec_speed', 'accel', 'settle', 'instrument')
+
+    def __init__(self, ra_speed=2., dec_speed=2., accel=1., settle=15., instrument=0.):
+        self.ra_speed = ra_speed
+        self.dec_speed = dec_speed
+        self.accel = accel
+        self.settle = settle
+        self.instrument = instrument
+
+    @staticmethod
+    def axis_time(dist, speed, accel):
+        """
+        Time for one axis to move dist degrees with a trapezoidal velocity profile
+        """
+        dist = numpy.abs(dist)
+
+        # Short moves never reach top speed, and are all acceleration and deceleration
+        return numpy.where(dist < (speed ** 2) / accel,
+                           2 * numpy.sqrt(dist / accel),
+                           (dist / speed) + (speed / accel))
+
+    def mount_time(self, dra, ddec):
+        return numpy.maximum(self.axis_time(dra, self.ra_speed, self.accel),
+                             self.axis_time(ddec, self.dec_speed, self.accel))
+
+    def seconds(self, ra1, dec1, ra2, dec2):
+        return self.mount_time(_ra_diff(ra1, ra2), numpy.asarray(dec2) - dec1) + self.settle + self.instrument
+
+    def fit(self, records):
+        """
+        Fit the model to records from the slew log
+
+        Records of kind 'slew' have the offsets dra, ddec(degrees) and the measured seconds
+        from the slew command to the mount being settled.  Records of kind 'instrument' have
+        the measured seconds of a slider/focuser move.  Speeds and acceleration are found by
+        a grid search, settle by least squares for each grid point.
+        """
+        slews = [r for r in records if r.get('kind') == 'slew']
+        instrument = [r['seconds'] for r in records if r.get('kind') == 'instrument']
+
+        if instrument:
+            # Each target moves to the science camera and back
+            self.instrument = 2 * float(numpy.median(instrument))
+
+        if len(slews) < 3:
+            logger.warning("Only {n} slews logged, not fitting the mount.".format(n=len(slews)))
+            return self
+
+        dra = numpy.array([r['dra'] for r in slews], dtype=float)
+        ddec = numpy.array([r['ddec'] for r in slews], dtype=float)
+        measured = numpy.array([r['seconds'] for r in slews], dtype=float)
+
+        speeds = numpy.logspace(-1.5, 1.5, 25)
+        accels = numpy.logspace(-2, 1.5, 15)
+
+        best = None
+        for accel in accels:
+            ra_t = self.axis_time(dra[:, None], speeds[None, :], accel)
+            dec_t = self.axis_time(ddec[:, None], speeds[None, :], accel)
+
+            # predicted[n, i, j] is slew n with ra_speed i and dec_speed j
+            predicted = numpy.maximum(ra_t[:, :, None], dec_t[:, None, :])
+            settle = numpy.maximum(0, (measured[:, None, None] - predicted).mean(axis=0))
+            err = ((measured[:, None, None] - predicted - settle) ** 2).sum(axis=0)
+
+            i, j = numpy.unravel_index(numpy.argmin(err), err.shape)
+            if best is None or err[i, j] < best[0]:
+                best = (err[i, j], speeds[i], speeds[j], accel, settle[i, j])
+
+        err, self.ra_speed, self.dec_speed, self.accel, self.settle = [float(x) for x in best]
+
+        logger.info("Fitted slew model to {n} slews, RMS error {rms:.1f} seconds.".format(
+            n=len(slews), rms=numpy.sqrt(err / len(slews))))
+
+        return self
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(dict((p, getattr(self, p)) for p in self.PARAMS), f, indent=4)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            return cls(**json.load(f))
+
+def load_slew_model(path, default=None):
+    """
+    Return the fitted AxisSlewModel saved at path, or default if there isn't one
+    """
+    if path and os.path.exists(path):
+        logger.info("Using slew model from " + path)
+        return AxisSlewModel.load(path)
+
+    return default
@@ -0,0 +1,120 @@
+import logging
+
+from sqlalchemy import func, or_
+
+from ..db.catalog import DoubleStar
+from ..db.targetlist import Target
+
+logger = logging.getLogger(__name__)
+
+class SnapshotTarget(object):
+    """
+    A compact, read-only copy of a Target
+
+    star is a DoubleStar that is not attached to any session, and only has the columns the
+    schedulers use(id, name, ra_deg, dec_deg, stype), so nothing is ever lazy-loaded from it
+    """
+    __slots__ = ('id', 'star_id', 'star', 'band', 'priority', 'requester', 'mpo', 'maxdt', 'mindt')
+
+    def __init__(self, row):
+        self.id = row.id
+        self.star_id = row.star_id
+        self.band = row.band
+        self.priority = row.priority
+        self.requester = row.requester
+        self.mpo = row.mpo
+        self.maxdt = row.maxdt
+        self.mindt = row.mindt
+
+        self.star = DoubleStar(id=row.star_id,
+                               name=row.name,
+                               ra_deg=row.ra_deg,
+                               dec_deg=row.dec_deg,
+                               stype=row.stype)
+
+    def __repr__(self):
+        return '<(SnapshotTarget) {star} {band}>'.format(star=self.star.name, band=self.band)
+
+class TargetSnapshot(object):
+    """
+    Every Target joined with its DoubleStar, loaded with a single query
+
+    refresh() only reloads the targets whose modified column has changed since the last
+    load, and drops targets that have been deleted, so re-reading the target list is cheap
+    when little or nothing has changed.
+
+    self.targets is a list of SnapshotTargets, in id order.  Targets that weren't reloaded are
+    the same objects after a refresh.
+    """
+    def __init__(self, session):
+        self.session = session
+
+        # { target id : SnapshotTarget }
+        self.by_id = {}
+        self.targets = []
+
+        # The latest Target.modified seen, the change marker for the targets table
+        self.marker = None
+
+        self.refresh()
+
+    def _query(self):
+        return self.session.query(Target.id,
+                                  Target.star_id,
+                                  Target.band,
+                                  Target.priority,
+                                  Target.requester,
+                                  Target.mpo,
+                                  Target.maxdt,
+                                  Target.mindt,
+                                  DoubleStar.name,
+                                  DoubleStar.ra_deg,
+                                  DoubleStar.dec_deg,
+                                  DoubleStar.stype).join(DoubleStar, Target.star_id == DoubleStar.id)
+
+    def refresh(self):
+        """
+        Bring the snapshot up to date with the targets table
+
+        Returns True if anything changed
+        """
+        marker = self.session.query(func.max(Target.modified)).scalar()
+        ids = set(i for i, in self.session.query(Target.id))
+
+        new = ids - set(self.by_id)
+        deleted = set(self.by_id) - ids
+
+        if not self.by_id:
+            rows = self._query().all()
+
+        else:
+            changed = []
+            if marker is not None and marker != self.marker:
+                # Rows modified in the same second as the old marker may not have been seen
+                changed.append(Target.modified >= self.marker if self.marker else Target.modified != None)
+
+            if new:
+                # Rows added since, even without a modified time
+                changed.append(Target.id.in_(list(new)))
+
+            rows = self._query().filter(or_(*changed)).all() if changed else []
+
+        for i in deleted:
+            del self.by_id[i]
+
+        for row in rows:
+            self.by_id[row.id] = SnapshotTarget(row)
+
+        # End the transaction so the next refresh sees new rows
+        self.session.commit()
+
+        self.marker = marker
+
+        if rows or deleted:
+            self.targets = [self.by_id[i] for i in sorted(self.by_id)]
+            logger.info("Target snapshot: {n} loaded, {d} deleted, {t} total.".format(
+                n=len(rows), d=len(deleted), t=len(self.targets)))
+
+            return True
+
+        return False
@@ -0,0 +1,136 @@
+import unittest
+import xmlrpclib
+import threading
+from SimpleXMLRPCServer import SimpleXMLRPCServer
+
+from asi.utils import binrpc
+from asi.utils.xmlrpc import Batch, RequestHandler, KeepAliveTransport, RPCClientOverloadWrapper
+
+class Camera(object):
+    def __init__(self):
+        self.calls = 0
+
+    def get_filename(self):
+        self.calls += 1
+        return "cube0001.fits"
+
+    def get_itime(self):
+        self.calls += 1
+        return 0.25
+
+    def set_itime(self, itime):
+        self.calls += 1
+        raise xmlrpclib.Fault(2, "Can't set itime to {0}".format(itime))
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.camera = Camera()
+
+        self.server = SimpleXMLRPCServer(("localhost", 0),
+                                         requestHandler=RequestHandler,
+                                         logRequests=False,
+                                         allow_none=True)
+        self.server.register_introspection_functions()
+        self.server.register_multicall_functions()
+        self.server.register_instance(self.camera)
+
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        addr = 'http://localhost:{port}'.format(port=self.server.server_address[1])
+        self.rpc = xmlrpclib.ServerProxy(addr, allow_none=True, transport=KeepAliveTransport(5))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_send(self):
+        batch = Batch(self.rpc)
+        filename = batch.get_filename()
+        itime = batch.get_itime()
+
+        self.assertRaises(RuntimeError, filename.get)
+        self.assertEqual(self.camera.calls, 0)
+
+        batch.send()
+
+        self.assertEqual(filename.get(), "cube0001.fits")
+        self.assertEqual(itime.get(), 0.25)
+        self.assertEqual(self.camera.calls, 2)
+
+        # Sent calls are forgotten, and there's nothing to send
+        batch.send()
+        self.assertEqual(self.camera.calls, 2)
+
+    def test_fault(self):
+        batch = Batch(self.rpc)
+        failed = batch.set_itime(3)
+        itime = batch.get_itime()
+        batch.send()
+
+        # A fault belongs to its own call only
+        self.assertRaises(xmlrpclib.Fault, failed.get)
+        self.assertEqual(failed.fault.faultCode, 2)
+        self.assertEqual(itime.get(), 0.25)
+
+    def test_with(self):
+        with Batch(self.rpc) as cam:
+            filename = cam.get_filename()
+
+        self.assertEqual(filename.get(), "cube0001.fits")
+
+        # Nothing is sent if the block raises
+        try:
+            with Batch(self.rpc) as cam:
+                filename = cam.get_filename()
+                raise ValueError
+
+        except ValueError:
+            pass
+
+        self.assertEqual(self.camera.calls, 1)
+        self.assertRaises(RuntimeError, filename.get)
+
+    def test_wrapper(self):
+        cam = RPCClientOverloadWrapper(None, rpc=self.rpc)
+
+        with cam.batch() as b:
+            filename = b.get_filename()
+            itime = b.get_itime()
+
+        self.assertEqual((filename.get(), itime.get()), ("cube0001.fits", 0.25))
+
+@unittest.skipIf(not binrpc.available(), "msgpack is not installed")
+class BinaryBatchTest(BatchTest):
+    """
+    The same, over the binary protocol
+    """
+    def setUp(self):
+        self.camera = Camera()
+
+        self.server = binrpc.BinaryRPCServer(("localhost", 0))
+        self.server.timeout = .01
+        self.server.register_introspection_functions()
+        self.server.register_multicall_functions()
+        self.server.register_instance(self.camera)
+
+        self.running = True
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.rpc = binrpc.BinaryServerProxy(self.server.server_address, timeout=5)
+
+    def tearDown(self):
+        self.rpc._close()
+        self.running = False
+        self.thread.join()
+        self.server.socket.close()
+
+    def serve(self):
+        while self.running:
+            self.server.handle_request()
+
+if __name__ == '__main__':
+    unittest.main()
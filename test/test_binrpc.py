@@ -0,0 +1,116 @@
+import time
+import unittest
+import xmlrpclib
+import threading
+
+from asi.utils import binrpc
+
+class Service(object):
+    def echo(self, value):
+        return value
+
+    def add(self, a, b):
+        return a + b
+
+    def fault(self):
+        raise xmlrpclib.Fault(4, "Not ready")
+
+    def error(self):
+        raise ValueError("bad value")
+
+@unittest.skipIf(not binrpc.available(), "msgpack is not installed")
+class BinaryRPCTest(unittest.TestCase):
+    def setUp(self):
+        self.server = binrpc.BinaryRPCServer(("localhost", 0))
+        self.server.timeout = .01
+        self.server.register_introspection_functions()
+        self.server.register_multicall_functions()
+        self.server.register_instance(Service())
+
+        # Set to have the server close every connection, cleared once it has
+        self.close = threading.Event()
+        self.running = True
+
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.proxy = binrpc.BinaryServerProxy(self.server.server_address, timeout=5)
+
+    def tearDown(self):
+        self.proxy._close()
+        self.running = False
+        self.thread.join()
+
+        for conn in self.server.buffers.keys():
+            self.server._drop(conn)
+
+        self.server.socket.close()
+
+    def serve(self):
+        while self.running:
+            self.server.handle_request()
+
+            if self.close.is_set():
+                for conn in self.server.buffers.keys():
+                    self.server._drop(conn)
+
+                self.close.clear()
+
+    def test_values(self):
+        for value in (None, True, False, 0, -1, 2 ** 40, 1.5, "", "text", u"\u00b0",
+                      [1, "two", 3.], {"ra" : 10.5, "dec" : -3.25}, [[1, 2], {"a" : [None]}]):
+            self.assertEqual(self.proxy.echo(value), value)
+
+        self.assertEqual(self.proxy.add(2, 3), 5)
+
+    def test_fault(self):
+        try:
+            self.proxy.fault()
+
+        except xmlrpclib.Fault, fault:
+            self.assertEqual(fault.faultCode, 4)
+            self.assertEqual(fault.faultString, "Not ready")
+
+        else:
+            self.fail("No Fault raised")
+
+        # Other exceptions are reported as SimpleXMLRPCServer reports them
+        try:
+            self.proxy.error()
+
+        except xmlrpclib.Fault, fault:
+            self.assertEqual(fault.faultCode, 1)
+            self.assertIn("bad value", fault.faultString)
+
+        else:
+            self.fail("No Fault raised")
+
+        self.assertRaises(xmlrpclib.Fault, self.proxy.no_such_method)
+
+        # The connection is still usable afterwards
+        self.assertEqual(self.proxy.echo(1), 1)
+
+    def test_multicall(self):
+        responses = self.proxy.system.multicall([
+            {'methodName' : 'add', 'params' : [1, 2]},
+            {'methodName' : 'fault', 'params' : []},
+            {'methodName' : 'echo', 'params' : ["x"]},
+            ])
+
+        self.assertEqual(responses[0], [3])
+        self.assertEqual(responses[1]['faultCode'], 4)
+        self.assertEqual(responses[2], ["x"])
+
+    def test_reconnect(self):
+        self.assertEqual(self.proxy.echo(1), 1)
+
+        self.close.set()
+        while self.close.is_set():
+            time.sleep(.01)
+
+        # The pooled connection the server closed is replaced
+        self.assertEqual(self.proxy.echo(2), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import math
+import datetime
+import unittest
+
+import numpy
+
+from asi.scheduler.cost import CostEngine, timestamp
+
+class Star(object):
+    def __init__(self, ra_deg, dec_deg):
+        self.ra_deg = ra_deg
+        self.dec_deg = dec_deg
+
+class Target(object):
+    def __init__(self, star_id, ra_deg, dec_deg, priority=None):
+        self.star_id = star_id
+        self.star = Star(ra_deg, dec_deg)
+        self.priority = priority
+
+class History(object):
+    """
+    Stands in for ObservationHistory, { star_id : seconds since the epoch }
+    """
+    def __init__(self, times):
+        self.times = times
+
+    def lookup(self, star_ids):
+        return numpy.array([self.times.get(i, numpy.nan) for i in star_ids], dtype=float)
+
+# Different for every term, so a term computed wrongly changes the cost
+WEIGHTS = dict(hour_angle_weight=1., distance_weight=2., moon_dist_weight=-.5, time_delta_weight=3.)
+
+class CostEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.now = datetime.datetime(2014, 6, 1, 23, 0, 0)
+        self.targets = [Target(1, 10., 20.),
+                        Target(2, 100., -5., priority=1),
+                        Target(3, 355., 45.),
+                        Target(4, 200., 0.)]
+
+        self.sky = dict(tele_ra=50., tele_dec=10., lst=120., moon_ra=250., moon_dec=-10., now=self.now)
+
+    def reference_cost(self, target, last=None):
+        """
+        The cost as WeightedSingleScheduler.cost computes it, one target at a time
+        """
+        star = target.star
+        sky = self.sky
+
+        ha = abs(star.ra_deg - sky['lst'])
+        tele_dist = math.sqrt((star.ra_deg - sky['tele_ra']) ** 2 + (star.dec_deg - sky['tele_dec']) ** 2)
+        hours = 2000. / (self.now - last).total_seconds() if last else 0
+        moon_dist = math.sqrt((star.ra_deg - sky['moon_ra']) ** 2 + (star.dec_deg - sky['moon_dec']) ** 2)
+
+        return (tele_dist * WEIGHTS['distance_weight']) + \
+               (hours     * WEIGHTS['time_delta_weight']) + \
+               (moon_dist * WEIGHTS['moon_dist_weight']) + \
+               (ha        * WEIGHTS['hour_angle_weight'])
+
+    def test_costs_match_reference(self):
+        engine = CostEngine(self.targets, **WEIGHTS)
+
+        expected = [self.reference_cost(t) for t in self.targets]
+        numpy.testing.assert_allclose(engine.costs(**self.sky), expected)
+
+        best = min(self.targets, key=self.reference_cost)
+        self.assertIs(engine.best(**self.sky), best)
+
+    def test_scheduled_and_observed(self):
+        observed = self.now - datetime.timedelta(hours=5)
+        scheduled = self.now - datetime.timedelta(hours=1)
+
+        engine = CostEngine(self.targets, history=History({2 : timestamp(observed)}), **WEIGHTS)
+        engine.mark_scheduled(self.targets[0], scheduled)
+
+        # Scheduling by this process takes precedence over the run log
+        engine.mark_scheduled(self.targets[1], scheduled)
+
+        expected = [self.reference_cost(self.targets[0], scheduled),
+                    self.reference_cost(self.targets[1], scheduled),
+                    self.reference_cost(self.targets[2]),
+                    self.reference_cost(self.targets[3])]
+        numpy.testing.assert_allclose(engine.costs(**self.sky), expected)
+
+        engine.clear_scheduled()
+
+        expected[0] = self.reference_cost(self.targets[0])
+        expected[1] = self.reference_cost(self.targets[1], observed)
+        numpy.testing.assert_allclose(engine.costs(**self.sky), expected)
+
+    def test_near_wraps_ra(self):
+        engine = CostEngine(self.targets, **WEIGHTS)
+
+        # 355 and 10 degrees of RA are 15 apart
+        self.assertEqual(list(engine.near(self.targets[0], 20., 30.)), [True, False, True, False])
+        self.assertEqual(list(engine.near(self.targets[0], 10., 30.)), [True, False, False, False])
+
+    def test_no_targets(self):
+        engine = CostEngine([], **WEIGHTS)
+
+        self.assertIsNone(engine.best(**self.sky))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import sys
+import datetime
+
+from sqlalchemy import func
+
+from asi import db
+from asi.db.catalog import DoubleStar, ReferenceStar, RefStarPairing, RefStarPairingBuild
+from asi.scheduler.scheduler import AbstractScheduler
+from asi.scheduler.refindex import ReferenceStarIndex
+from asi.utils import astro
+
+# The number of reference stars to rank for each double
+DEFAULT_N = 10
+
+# Doubles are paired and written in chunks of this many
+CHUNK_SIZE = 1000
+
+def refstars_signature(sess):
+    """
+    Return a string that changes whenever reference stars are added, removed or moved
+    """
+    count, max_id, ra_sum, dec_sum = sess.query(func.count(ReferenceStar.id),
+                                                func.max(ReferenceStar.id),
+                                                func.sum(ReferenceStar.ra_deg),
+                                                func.sum(ReferenceStar.dec_deg)).one()
+
+    return '{0}:{1}:{2:.6f}:{3:.6f}'.format(count, max_id, ra_sum or 0, dec_sum or 0)
+
+def pair(index, dbl, n):
+    """
+    Return the rows of refstar_pairs for the double dbl, an (id, ra_deg, dec_deg, stype) tuple
+    """
+    dbl_id, ra, dec, stype = dbl
+    stype_num = astro.stype_to_number(stype)
+
+    ranked = index.ranked(ra, dec, stype_num,
+                          AbstractScheduler.MAX_SINGLE_DIST_RA,
+                          AbstractScheduler.MAX_SINGLE_DIST_DEC,
+                          n)
+
+    return [dict(double_id=dbl_id,
+                 refstar_id=int(index.ids[i]),
+                 rank=rank,
+                 stype_diff=int(abs(index.stype[i] - stype_num)),
+                 dist=float(index.dist([i], ra, dec)[0]),
+                 double_ra_deg=ra,
+                 double_dec_deg=dec,
+                 double_stype=stype)
+            for rank, i in enumerate(ranked)]
+
+if __name__ == '__main__':
+    if len(sys.argv) > 3 or '-h' in sys.argv or '--help' in sys.argv:
+        print 'USAGE: build_refstar_pairs.py [--full] [N]'
+        print '    Rank the N(default {n}) best reference stars for every double star.'.format(n=DEFAULT_N)
+        print '    Only doubles that are new or have changed are paired, unless the reference'
+        print '    star catalog changed or --full is given, in which case every double is.'
+        sys.exit(-1)
+
+    full = '--full' in sys.argv
+    args = [a for a in sys.argv[1:] if a != '--full']
+    n = int(args[0]) if args else DEFAULT_N
+
+    sess = db.Session()
+    connection = db.engine.connect()
+    pairs = RefStarPairing.__table__
+
+    signature = refstars_signature(sess)
+    last_build = sess.query(RefStarPairingBuild).order_by(RefStarPairingBuild.id.desc()).first()
+
+    if last_build is None or last_build.refstars_signature != signature:
+        print "Reference star catalog has changed since the last build."
+        full = True
+
+    print "Loading double stars..."
+    doubles = sess.query(DoubleStar.id, DoubleStar.ra_deg, DoubleStar.dec_deg, DoubleStar.stype).filter(
+        DoubleStar.ra_deg != None,
+        DoubleStar.dec_deg != None).all()
+
+    if full:
+        print "Removing all existing pairings..."
+        connection.execute(pairs.delete())
+        stale = doubles
+
+    else:
+        # The state of each double when it was last paired
+        paired = dict((p.double_id, (p.double_ra_deg, p.double_dec_deg, p.double_stype))
+                      for p in sess.query(RefStarPairing.double_id,
+                                          RefStarPairing.double_ra_deg,
+                                          RefStarPairing.double_dec_deg,
+                                          RefStarPairing.double_stype).filter(RefStarPairing.rank == 0))
+
+        stale = [d for d in doubles if paired.get(d.id) != (d.ra_deg, d.dec_deg, d.stype)]
+
+        removed = set(paired) - set(d.id for d in doubles)
+        if removed:
+            print "Removing pairings of {0} deleted doubles...".format(len(removed))
+            connection.execute(pairs.delete().where(pairs.c.double_id.in_(list(removed))))
+
+    print "Pairing {0} of {1} doubles...".format(len(stale), len(doubles))
+
+    print "Indexing reference stars..."
+    index = ReferenceStarIndex(sess)
+
+    total = float(len(stale))
+    for start in range(0, len(stale), CHUNK_SIZE):
+        chunk = stale[start:start + CHUNK_SIZE]
+
+        rows = []
+        for dbl in chunk:
+            rows.extend(pair(index, dbl, n))
+
+        if not full:
+            connection.execute(pairs.delete().where(pairs.c.double_id.in_([d.id for d in chunk])))
+
+        if rows:
+            connection.execute(pairs.insert(), rows)
+
+        perc = round(100 * (start + len(chunk)) / total, 1)
+        status = '=' * int(.7 * perc) + '>'
+        status += ' '*(70 - len(status))
+        sys.stdout.write("\r |{status}| {perc}%".format(status=status, perc=perc))
+
+    print
+
+    sess.add(RefStarPairingBuild(datetime=datetime.datetime.now(), refstars_signature=signature))
+    sess.commit()
+
+    print "Total Doubles Paired: ", len(stale)
@@ -0,0 +1,26 @@
+import sys
+
+from asi import config
+from asi.utils import journal
+from asi.scheduler.slewtime import AxisSlewModel, load_slew_model
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        print 'USAGE: fit_slew_model.py [path-to-slew-log]'
+        print '    Fit the scheduler slew time model to the slew log(config.slew_log by default)'
+        print '    and save it to config.slew_model'
+        sys.exit(-1)
+
+    path = sys.argv[1] if len(sys.argv) == 2 else config.slew_log
+
+    print "Reading slew log {path}...".format(path=path)
+    records = journal.read(path)
+
+    print "Fitting {n} records...".format(n=len(records))
+    model = load_slew_model(config.slew_model, AxisSlewModel()).fit(records)
+
+    for param in AxisSlewModel.PARAMS:
+        print "    {0:>12}: {1:.3f}".format(param, getattr(model, param))
+
+    model.save(config.slew_model)
+    print "Saved slew model to {path}".format(path=config.slew_model)
@@ -0,0 +1,75 @@
+import sys
+from collections import defaultdict
+
+import numpy
+
+from asi import config
+from asi.utils import journal
+
+# Sequence steps during which the science camera shutter is open, the cubes of a burst
+# before the last are numbered, e.g. 'cube1'
+SHUTTER_STEPS = ('cube',)
+
+# The number of overhead contributors listed for each night
+TOP_N = 5
+
+def report(night, records):
+    boundaries = [r for r in records if r['kind'] == 'boundary']
+    sequence = [r for r in records if r['kind'] == 'sequence']
+
+    if not boundaries:
+        return
+
+    start = min(r['start'] for r in boundaries)
+    end = max(r['end'] for r in boundaries)
+    span = end - start
+
+    shutter = sum(r['seconds'] for r in sequence if r['step'].rstrip('0123456789') in SHUTTER_STEPS)
+    targets = len(set(r['target'] for r in boundaries if r['target']))
+
+    print "Night of {night}: {hours:.2f} hours, {n} targets".format(night=night, hours=span / 3600., n=targets)
+    print "    Open shutter: {hours:.2f} hours, {eff:.1f}% efficiency".format(
+        hours=shutter / 3600., eff=100. * shutter / span if span else 0)
+    print
+
+    # { (kind, step) : [seconds, ...] }
+    times = defaultdict(list)
+    for r in records:
+        times[(r['kind'], r['step'])].append(r['seconds'])
+
+    print "    {0:<10} {1:<16} {2:>6} {3:>9} {4:>9} {5:>9} {6:>9} {7:>10}".format(
+        "kind", "step", "count", "p50 (s)", "p90 (s)", "p99 (s)", "max (s)", "total (s)")
+    for (kind, step), secs in sorted(times.items()):
+        p50, p90, p99 = numpy.percentile(secs, [50, 90, 99])
+        print "    {0:<10} {1:<16} {2:>6} {3:>9.1f} {4:>9.1f} {5:>9.1f} {6:>9.1f} {7:>10.0f}".format(
+            kind, step, len(secs), p50, p90, p99, max(secs), sum(secs))
+    print
+
+    # Task boundaries follow each other, so their totals add up to the night, which makes
+    # them the overheads to compare.  takedata includes the shutter time.
+    overheads = [(sum(secs) - (shutter if step == 'takedata' else 0), step)
+                 for (kind, step), secs in times.items() if kind == 'boundary']
+    overheads.sort(reverse=True)
+
+    print "    Top overheads:"
+    for secs, step in overheads[:TOP_N]:
+        print "    {0:<16} {1:>8.0f}s {2:>6.1f}%".format(step, secs, 100. * secs / span if span else 0)
+    print
+
+if __name__ == '__main__':
+    if len(sys.argv) > 3:
+        print 'USAGE: overhead_report.py [path-to-metrics-log] [night]'
+        print '    Summarize step timings from the metrics log(config.metrics_log by default),'
+        print '    for every night, or only night(YYYY-MM-DD, the date the night began)'
+        sys.exit(-1)
+
+    path = sys.argv[1] if len(sys.argv) > 1 else config.metrics_log
+    only = sys.argv[2] if len(sys.argv) > 2 else None
+
+    nights = defaultdict(list)
+    for r in journal.read(path):
+        nights[r['night']].append(r)
+
+    for night in sorted(nights):
+        if only is None or night == only:
+            report(night, nights[night])
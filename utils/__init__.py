@@ -1,2 +1,7 @@
 import xmlrpc
 import astro
+import journal
+import checkpoint
+import binrpc
+import pubsub
+import service
@@ -3,6 +3,8 @@
 import logging
 import math
 
+import numpy
+
 logger = logging.getLogger(__name__)
 
 SPECTRAL_LETTER_MAP = {
@@ -50,3 +52,17 @@ def dist(s1, s2):
     return the angular Euclidean distance between them
     """
     return math.sqrt((s1.ra_deg - s2.ra_deg)**2 + (s1.dec_deg - s2.dec_deg)**2)
+
+def altitude(ra_deg, dec_deg, lst_deg, lat_deg):
+    """
+    Return the altitude in degrees of an object at (ra_deg, dec_deg) seen from latitude lat_deg
+    when the local sidereal time is lst_deg
+
+    Any of the arguments can be NumPy arrays, and are broadcast against each other
+    """
+    ha = numpy.radians(numpy.asarray(lst_deg) - ra_deg)
+    dec = numpy.radians(dec_deg)
+    lat = numpy.radians(lat_deg)
+
+    return numpy.degrees(numpy.arcsin(numpy.sin(dec) * numpy.sin(lat) +
+                                      numpy.cos(dec) * numpy.cos(lat) * numpy.cos(ha)))
@@ -0,0 +1,351 @@
+# A compact binary alternative to XML-RPC, for the same RPCAble services
+
+import errno
+import select
+import socket
+import struct
+import logging
+import urlparse
+import xmlrpclib
+import itertools
+import threading
+from SimpleXMLRPCServer import SimpleXMLRPCDispatcher
+
+try:
+    import msgpack
+
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Each service serves the binary protocol on its XML-RPC port plus PORT_OFFSET
+PORT_OFFSET = 1000
+
+# Every message is its length, then that many bytes of msgpack
+HEADER = struct.Struct('!I')
+
+# Messages are [REQUEST, id, method, params] and [RESPONSE, id, error, result], as msgpack-rpc
+REQUEST = 0
+RESPONSE = 1
+
+class ConnectionClosed(socket.error):
+    pass
+
+def available():
+    """
+    True if msgpack is installed, without it the binary protocol isn't served or used
+    """
+    return msgpack is not None
+
+def binary_address(addr):
+    """
+    The (host, port) the binary protocol is served on, for the service at the XML-RPC url addr
+    """
+    url = urlparse.urlparse(addr)
+
+    return url.hostname, url.port + PORT_OFFSET
+
+def pack(obj):
+    data = msgpack.packb(obj, use_bin_type=True)
+
+    return HEADER.pack(len(data)) + data
+
+def unpack(data):
+    return msgpack.unpackb(data, raw=False)
+
+def _recv_exactly(sock, n):
+    chunks = []
+    while n:
+        chunk = sock.recv(n)
+        if not chunk:
+            raise ConnectionClosed(errno.ECONNRESET, "Connection closed by the server")
+
+        chunks.append(chunk)
+        n -= len(chunk)
+
+    return ''.join(chunks)
+
+def recv_message(sock):
+    n, = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+
+    return unpack(_recv_exactly(sock, n))
+
+class BinaryRPCServer(SimpleXMLRPCDispatcher):
+    """
+    Serves the functions registered with it over the binary protocol
+
+    Functions are registered just like with SimpleXMLRPCServer, so an RPCAble's
+    register_xmlrpc_functions() registers it with either, and a service can serve both.
+
+    Clients keep their connection open.  handle_request() serves every connection from one
+    thread, waiting up to timeout seconds for requests on any of them, like
+    SimpleXMLRPCServer.handle_request().  serve_forever() serves each connection from a
+    thread of its own instead.  Without msgpack nothing is served, and clients fall back to
+    XML-RPC.
+    """
+    # Seconds to wait for a client to take its response before dropping it
+    SEND_TIMEOUT = 5.
+
+    def __init__(self, addr):
+        SimpleXMLRPCDispatcher.__init__(self, allow_none=True, encoding=None)
+
+        self.timeout = None
+
+        # { connection : bytes received but not handled yet }
+        self.buffers = {}
+
+        if not available():
+            logger.warning("msgpack is not installed, not serving binary RPC on {0}".format(addr))
+            self.socket = None
+            return
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(addr)
+        self.socket.listen(5)
+
+        self.server_address = self.socket.getsockname()
+
+    def sockets(self):
+        """
+        The sockets to select() on for this server, see handle_readable()
+        """
+        if self.socket is None:
+            return []
+
+        return [self.socket] + self.buffers.keys()
+
+    def handle_request(self):
+        """
+        Handle the requests that arrive in the next timeout seconds(None blocks until one does)
+        """
+        if self.socket is None:
+            return
+
+        try:
+            readable, _, _ = select.select(self.sockets(), [], [], self.timeout)
+
+        except select.error, e:
+            logger.debug("select interrupted: " + str(e))
+            return
+
+        self.handle_readable(readable)
+
+    def handle_readable(self, readable):
+        """
+        Accept connections and handle requests on the sockets in readable that are this server's
+        """
+        for sock in readable:
+            if sock is self.socket:
+                self._accept()
+
+            elif sock in self.buffers:
+                self._read(sock)
+
+    def serve_forever(self):
+        """
+        Serve each connection from a thread of its own, until the process ends
+        """
+        if self.socket is None:
+            return
+
+        while True:
+            try:
+                conn, addr = self.socket.accept()
+
+            except socket.error, e:
+                logger.warning("Could not accept a connection: " + str(e))
+                continue
+
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            thread = threading.Thread(target=self._serve_connection, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve_connection(self, conn):
+        try:
+            while True:
+                n, = HEADER.unpack(_recv_exactly(conn, HEADER.size))
+                conn.sendall(self._handle(_recv_exactly(conn, n)))
+
+        except socket.error:
+            # The client has gone
+            pass
+
+        finally:
+            conn.close()
+
+    def _accept(self):
+        try:
+            conn, addr = self.socket.accept()
+
+        except socket.error, e:
+            logger.warning("Could not accept a connection: " + str(e))
+            return
+
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn.settimeout(self.SEND_TIMEOUT)
+        self.buffers[conn] = ''
+
+    def _drop(self, conn):
+        del self.buffers[conn]
+        conn.close()
+
+    def _read(self, conn):
+        try:
+            data = conn.recv(65536)
+
+        except socket.error:
+            data = ''
+
+        if not data:
+            self._drop(conn)
+            return
+
+        buf = self.buffers[conn] + data
+        try:
+            # Handle every complete request, and keep the rest for later
+            while len(buf) >= HEADER.size:
+                n, = HEADER.unpack_from(buf)
+                if len(buf) < HEADER.size + n:
+                    break
+
+                request = buf[HEADER.size:HEADER.size + n]
+                buf = buf[HEADER.size + n:]
+
+                conn.sendall(self._handle(request))
+
+        except socket.error, e:
+            logger.warning("Dropping binary RPC client: " + str(e))
+            self._drop(conn)
+            return
+
+        self.buffers[conn] = buf
+
+    def _handle(self, request):
+        """
+        Return the packed response to the packed request
+        """
+        msgid = None
+        try:
+            kind, msgid, method, params = unpack(request)
+            return pack([RESPONSE, msgid, None, self._dispatch(method, params)])
+
+        except xmlrpclib.Fault, fault:
+            error = [fault.faultCode, fault.faultString]
+
+        except Exception, e:
+            # As SimpleXMLRPCServer reports exceptions
+            error = [1, "%s:%s" % (e.__class__, e)]
+
+        return pack([RESPONSE, msgid, error, None])
+
+# Connections of BinaryServerProxy, { (host, port) : socket } for each thread
+_connections = threading.local()
+
+class _Method(object):
+    def __init__(self, call, name):
+        self._call = call
+        self._name = name
+
+    def __getattr__(self, name):
+        return _Method(self._call, self._name + '.' + name)
+
+    def __call__(self, *args):
+        return self._call(self._name, args)
+
+class BinaryServerProxy(object):
+    """
+    A connection to a BinaryRPCServer at addr, (host, port), used like xmlrpclib.ServerProxy
+
+    Each thread has its own connection to the server, kept open between calls, and one the
+    server has closed is reconnected on the next call.  Every call times out after timeout
+    seconds, if it is given.  Errors raised by the service are raised as xmlrpclib.Fault.
+    """
+    def __init__(self, addr, timeout=None):
+        self._addr = tuple(addr)
+        self._timeout = timeout
+        self._ids = itertools.count()
+
+    def _pool(self):
+        if not hasattr(_connections, 'pool'):
+            _connections.pool = {}
+
+        return _connections.pool
+
+    def _connect(self):
+        """
+        Return this thread's connection to the server, and whether it was made for this call
+        """
+        pool = self._pool()
+
+        fresh = self._addr not in pool
+        if fresh:
+            sock = socket.create_connection(self._addr, self._timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            pool[self._addr] = sock
+
+        sock = pool[self._addr]
+        sock.settimeout(self._timeout)
+
+        return sock, fresh
+
+    def _close(self):
+        sock = self._pool().pop(self._addr, None)
+        if sock is not None:
+            sock.close()
+
+    def _call(self, method, params):
+        # Retry once if a pooled connection turns out to have been closed
+        for attempt in (0, 1):
+            sock, fresh = self._connect()
+            msgid = next(self._ids)
+
+            try:
+                sock.sendall(pack([REQUEST, msgid, method, list(params)]))
+                kind, response_id, error, result = recv_message(sock)
+
+            except socket.error, e:
+                self._close()
+                if fresh or attempt or e.errno not in (errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE):
+                    raise
+
+                continue
+
+            except:
+                self._close()
+                raise
+
+            if response_id != msgid:
+                self._close()
+                raise xmlrpclib.ProtocolError(str(self._addr), 0, "Response to the wrong request", {})
+
+            if error is not None:
+                raise xmlrpclib.Fault(*error)
+
+            return result
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        return _Method(self._call, name)
+
+def serve(server, binserver, timeout):
+    """
+    Handle the requests to the XML-RPC server and binserver that arrive in the next timeout
+    seconds, whichever they come to
+    """
+    try:
+        readable, _, _ = select.select([server] + binserver.sockets(), [], [], timeout)
+
+    except select.error, e:
+        logger.debug("select interrupted: " + str(e))
+        return
+
+    if server in readable:
+        server.handle_request()
+
+    binserver.handle_readable(readable)
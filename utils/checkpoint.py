@@ -0,0 +1,65 @@
+# Checkpoints of a service's state in a local JSON file, for recovering from a crash
+
+import os
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Checkpoints older than this(seconds) are from another night, and aren't restored
+MAX_AGE = 12 * 3600
+
+def save(path, state):
+    """
+    Save the dictionary state to path
+
+    The checkpoint is written to a temporary file and renamed over the old one, so a crash
+    while saving leaves the previous checkpoint intact
+    """
+    state = dict(state, saved=time.time())
+    tmp = path + '.tmp'
+
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+
+        try:
+            os.rename(tmp, path)
+
+        except OSError:
+            # Windows won't rename over an existing file
+            os.remove(path)
+            os.rename(tmp, path)
+
+    except (IOError, OSError), e:
+        logger.warning("Could not save checkpoint {path}: {e}".format(path=path, e=e))
+
+def load(path, max_age=MAX_AGE):
+    """
+    Return the state saved at path, or None if there isn't one, or it is too old to use
+    """
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+
+    except (IOError, ValueError), e:
+        logger.warning("Could not read checkpoint {path}: {e}".format(path=path, e=e))
+        return None
+
+    age = time.time() - state.get('saved', 0)
+    if age > max_age:
+        logger.info("Ignoring checkpoint {path}, {hours:.1f} hours old".format(path=path, hours=age / 3600.))
+        return None
+
+    return state
+
+def clear(path):
+    """
+    Remove the checkpoint at path, if there is one
+    """
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,38 @@
+# Append-only journals of JSON records, one per line
+
+import json
+import logging
+import os.path
+
+logger = logging.getLogger(__name__)
+
+def append(path, record):
+    """
+    Append the dictionary record to the journal at path, creating it if needed
+    """
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+def read(path):
+    """
+    Return a list of every record in the journal at path, oldest first
+
+    A missing journal is empty.  Lines that can't be parsed(e.g. a partial line left by a
+    crash) are skipped with a warning.
+    """
+    if not os.path.exists(path):
+        return []
+
+    records = []
+    with open(path, 'r') as f:
+        for n, line in enumerate(f):
+            if not line.strip():
+                continue
+
+            try:
+                records.append(json.loads(line))
+
+            except ValueError:
+                logger.warning("Skipping unreadable line {n} of {path}.".format(n=n + 1, path=path))
+
+    return records
@@ -0,0 +1,217 @@
+# Pushes changes of a service's state to subscribers, so they don't have to poll for them
+
+import json
+import time
+import Queue
+import socket
+import logging
+import urlparse
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Each service publishes on its XML-RPC port plus PORT_OFFSET
+PORT_OFFSET = 2000
+
+def publisher_address(addr):
+    """
+    The (host, port) the service at the XML-RPC url addr publishes on
+    """
+    url = urlparse.urlparse(addr)
+
+    return url.hostname, url.port + PORT_OFFSET
+
+class Publisher(object):
+    """
+    Sends every change of a topic's value to everyone subscribed at addr
+
+    A subscriber is sent the latest value of every topic when it connects, then each change
+    as it is published.  Messages are JSON objects of topic, value and time, one per line.
+
+    Each subscriber is sent its messages from a thread of its own, so publish() never waits
+    on the network, and a slow subscriber doesn't hold up the others or the service.
+    """
+    # Seconds a subscriber may take to receive a message before it is dropped
+    SEND_TIMEOUT = 1.
+
+    def __init__(self, addr):
+        self.lock = threading.Lock()
+
+        # { topic : latest value }
+        self.state = {}
+
+        # The queue of messages to send to each subscriber
+        self.subscribers = []
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(addr)
+        self.socket.listen(5)
+
+        self.address = self.socket.getsockname()
+
+        thread = threading.Thread(target=self._accept, name='publisher')
+        thread.daemon = True
+        thread.start()
+
+    def _message(self, topic, value):
+        return json.dumps({'topic' : topic, 'value' : value, 'time' : time.time()}) + '\n'
+
+    def _accept(self):
+        while True:
+            try:
+                conn, addr = self.socket.accept()
+
+            except socket.error, e:
+                logger.warning("Could not accept a subscriber: " + str(e))
+                continue
+
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.settimeout(self.SEND_TIMEOUT)
+
+            queue = Queue.Queue()
+            with self.lock:
+                queue.put(''.join(self._message(t, v) for t, v in self.state.items()))
+                self.subscribers.append(queue)
+
+            thread = threading.Thread(target=self._send, args=(conn, addr, queue), name='subscriber')
+            thread.daemon = True
+            thread.start()
+
+    def _send(self, conn, addr, queue):
+        """
+        Send what is put in queue to the subscriber conn, until it is dropped
+        """
+        try:
+            while True:
+                conn.sendall(queue.get())
+
+        except socket.error, e:
+            logger.warning("Dropping subscriber {addr}: {e}".format(addr=addr, e=e))
+
+        finally:
+            with self.lock:
+                self.subscribers.remove(queue)
+
+            conn.close()
+
+    def publish(self, topic, value):
+        """
+        Send value to the subscribers, if it is a change to topic
+        """
+        with self.lock:
+            if topic in self.state and self.state[topic] == value:
+                return
+
+            self.state[topic] = value
+            message = self._message(topic, value)
+
+            for queue in self.subscribers:
+                queue.put(message)
+
+class Subscription(threading.Thread):
+    """
+    Receives what the Publisher at addr, (host, port), publishes, from a thread of its own
+
+    The latest value of each topic is kept(see get()), functions given to on() are called
+    from this thread with (topic, value) for every change, and wait() blocks until a topic has
+    a value.  If the publisher can't be reached the connection is retried every RETRY
+    seconds, and when it is, everything is sent again.  While it isn't connected nothing is
+    known, so every topic goes back to having no value, and functions are called with None.
+    """
+    RETRY = 5.
+
+    def __init__(self, addr):
+        super(Subscription, self).__init__(name='subscription')
+        self.daemon = True
+
+        self.addr = tuple(addr)
+        self.cond = threading.Condition()
+
+        # { topic : latest value }
+        self.state = {}
+
+        # [ (topic, or None for every topic, function) ]
+        self.callbacks = []
+
+        self.connected = False
+
+        self.start()
+
+    def on(self, topic, func):
+        """
+        Call func(topic, value) whenever topic changes, or any topic if topic is None
+        """
+        self.callbacks.append((topic, func))
+
+    def get(self, topic, default=None):
+        with self.cond:
+            return self.state.get(topic, default)
+
+    def wait(self, topic, value, timeout=None):
+        """
+        Wait until topic is value, for up to timeout seconds, returning whether it is
+        """
+        end = None if timeout is None else time.time() + timeout
+
+        with self.cond:
+            while self.state.get(topic) != value:
+                remaining = None if end is None else end - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+
+                self.cond.wait(remaining)
+
+            return True
+
+    def _received(self, topic, value):
+        with self.cond:
+            self.state[topic] = value
+            self.cond.notify_all()
+
+        self._notify(topic, value)
+
+    def _notify(self, topic, value):
+        for t, func in self.callbacks:
+            if t is None or t == topic:
+                try:
+                    func(topic, value)
+
+                except Exception:
+                    logger.exception("Subscriber to {topic} failed".format(topic=topic))
+
+    def _disconnected(self):
+        self.connected = False
+
+        with self.cond:
+            topics = self.state.keys()
+            self.state = {}
+            self.cond.notify_all()
+
+        for topic in topics:
+            self._notify(topic, None)
+
+    def run(self):
+        while True:
+            try:
+                sock = socket.create_connection(self.addr)
+
+            except socket.error, e:
+                logger.debug("Could not subscribe to {addr}: {e}".format(addr=self.addr, e=e))
+                time.sleep(self.RETRY)
+                continue
+
+            self.connected = True
+            try:
+                for line in sock.makefile('r'):
+                    message = json.loads(line)
+                    self._received(message['topic'], message['value'])
+
+            except (socket.error, ValueError), e:
+                logger.warning("Lost subscription to {addr}: {e}".format(addr=self.addr, e=e))
+
+            finally:
+                sock.close()
+                self._disconnected()
+
+            time.sleep(self.RETRY)
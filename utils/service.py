@@ -0,0 +1,159 @@
+# Hosts RPCAble devices over XML-RPC and the binary protocol, without a busy loop
+
+import time
+import logging
+import functools
+import threading
+import SocketServer
+from SimpleXMLRPCServer import SimpleXMLRPCServer
+
+from xmlrpc import RequestHandler
+import binrpc
+import pubsub
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of a device's watched state, see ServiceHost.add()
+WATCH_INTERVAL = .1
+
+class ThreadedRequestHandler(RequestHandler):
+    # Each connection has a thread of its own, so an idle one doesn't hold up anyone else
+    KEEPALIVE_TIMEOUT = 10.
+
+class ThreadedXMLRPCServer(SocketServer.ThreadingMixIn, SimpleXMLRPCServer):
+    """
+    An XML-RPC server that serves each connection from a thread of its own
+    """
+    daemon_threads = True
+
+def _locked(lock, func):
+    """
+    Wrap func so calls to it hold lock
+    """
+    @functools.wraps(func)
+    def call(*args):
+        with lock:
+            return func(*args)
+
+    return call
+
+class ServiceHost(object):
+    """
+    Serves the RPCAble devices added to it on port over XML-RPC, and on
+    port + binrpc.PORT_OFFSET over the binary protocol, and publishes changes of their state
+    on port + pubsub.PORT_OFFSET(see add())
+
+    Threaded, every connection is served from a thread of its own, so a slow call doesn't
+    hold up other clients.  Each device has a lock, held for every call to it and for its
+    update(), so a device is only ever used by one thread at a time, and two devices can be
+    used at once.
+
+    Not threaded, everything runs in the thread that calls serve_forever(), which waits in
+    select() for requests or the next update() or watch.  This is for devices that have to be used
+    from the thread that created them, like ASCOM and MaxIm DL's COM objects.
+
+    Either way, the host sleeps until there is something to do, rather than polling.
+    """
+    def __init__(self, port, threaded=True, host='localhost'):
+        self.threaded = threaded
+
+        if threaded:
+            self.server = ThreadedXMLRPCServer((host, port),
+                                               requestHandler=ThreadedRequestHandler,
+                                               logRequests=False,
+                                               allow_none=True)
+
+        else:
+            self.server = SimpleXMLRPCServer((host, port),
+                                             requestHandler=RequestHandler,
+                                             logRequests=False,
+                                             allow_none=True)
+
+        self.binserver = binrpc.BinaryRPCServer((host, port + binrpc.PORT_OFFSET))
+
+        self.server.register_introspection_functions()
+        self.binserver.register_introspection_functions()
+
+        self.publisher = pubsub.Publisher((host, port + pubsub.PORT_OFFSET))
+
+        # [ [seconds between calls, function] ] run by serve_forever()
+        self.timers = []
+
+    def add(self, device, update_interval=None, watch=('ready',), watch_interval=WATCH_INTERVAL):
+        """
+        Serve device's RPC methods, and call device.update() every update_interval seconds
+
+        The device's methods named in watch(those it has) are called every watch_interval
+        seconds, and what they return is published under their names when it changes
+        """
+        lock = threading.RLock()
+
+        for server in (self.server, self.binserver):
+            before = set(server.funcs)
+            device.register_xmlrpc_functions(server)
+
+            for name in set(server.funcs) - before:
+                if not name.startswith('system.'):
+                    server.funcs[name] = _locked(lock, server.funcs[name])
+
+        if update_interval is not None:
+            self.timers.append([update_interval, functools.partial(self._update, device, lock)])
+
+        watch = [name for name in watch if hasattr(device, name)]
+        if watch:
+            self.timers.append([watch_interval, functools.partial(self._watch, device, lock, watch)])
+
+    def _update(self, device, lock):
+        with lock:
+            try:
+                device.update()
+
+            except Exception:
+                logger.exception("{name}.update() failed".format(name=device.__class__.__name__))
+
+    def _watch(self, device, lock, names):
+        for name in names:
+            with lock:
+                try:
+                    value = getattr(device, name)()
+
+                except Exception:
+                    logger.exception("{name}() failed".format(name=name))
+                    continue
+
+            self.publisher.publish(name, value)
+
+    def _tick(self, interval, func):
+        while True:
+            func()
+            time.sleep(interval)
+
+    def _start(self, target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+
+    def serve_forever(self):
+        if self.threaded:
+            for interval, func in self.timers:
+                self._start(self._tick, interval, func)
+
+            self._start(self.binserver.serve_forever)
+            self.server.serve_forever()
+
+        else:
+            self._serve_single()
+
+    def _serve_single(self):
+        # The time each timer is next due, in the same order
+        due = [0] * len(self.timers)
+
+        while True:
+            now = time.time()
+            for i, (interval, func) in enumerate(self.timers):
+                if due[i] <= now:
+                    func()
+                    due[i] = now + interval
+
+            timeout = max(min(due) - time.time(), 0) if due else None
+            binrpc.serve(self.server, self.binserver, timeout)
@@ -1,9 +1,104 @@
+import select
+import httplib
 import xmlrpclib
+import threading
 from SimpleXMLRPCServer import SimpleXMLRPCRequestHandler
 
 # Default request handler for the XML-RPC server
 class RequestHandler(SimpleXMLRPCRequestHandler):
+    """
+    Serves HTTP/1.1, so a client can make many calls over one connection
+
+    A single threaded server serves one connection at a time, and can't hold one open
+    between calls that are spaced out, like ready() polls, without holding up every other
+    client.  So by default each connection is closed after its request, and the response
+    says so, so the client reconnects for its next call instead of finding out by sending it.
+
+    A server that serves each connection from a thread of its own keeps connections open by
+    setting KEEPALIVE_TIMEOUT, the seconds an idle connection is kept(see
+    utils.service.ThreadedRequestHandler).
+    """
     rpc_paths = ('/RPC2')
+    protocol_version = 'HTTP/1.1'
+
+    KEEPALIVE_TIMEOUT = 0
+
+    def end_headers(self):
+        if not self.KEEPALIVE_TIMEOUT:
+            # Also sets close_connection
+            self.send_header('Connection', 'close')
+
+        SimpleXMLRPCRequestHandler.end_headers(self)
+
+    def handle(self):
+        self.close_connection = 1
+        self.handle_one_request()
+
+        while not self.close_connection:
+            # Wait here rather than in a blocking read, which logs an error when it times out
+            readable, _, _ = select.select([self.connection], [], [], self.KEEPALIVE_TIMEOUT)
+            if not readable:
+                break
+
+            self.handle_one_request()
+
+# Connections of KeepAliveTransport, { host : HTTPConnection } for each thread
+_connections = threading.local()
+
+class KeepAliveTransport(xmlrpclib.Transport):
+    """
+    An XML-RPC transport that keeps its HTTP/1.1 connection open between calls
+
+    Connections are pooled by host, one for each thread, so every ServerProxy using this
+    transport in a thread shares a connection to the server, and proxies can be used from
+    more than one thread.  A pooled connection is only reused while it is still open: one the
+    server said it would close is reopened by httplib, one the server has closed since is
+    reopened before the call, and one that is closed while a call is sent is retried by
+    xmlrpclib.Transport.request.  Every call times out after timeout seconds, if it is given.
+    """
+    def __init__(self, timeout=None, use_datetime=0):
+        xmlrpclib.Transport.__init__(self, use_datetime)
+        self.timeout = timeout
+
+        # The hosts this transport has connected to, its proxy only ever has one
+        self._hosts = set()
+
+    def _pool(self):
+        if not hasattr(_connections, 'pool'):
+            _connections.pool = {}
+
+        return _connections.pool
+
+    def make_connection(self, host):
+        pool = self._pool()
+
+        chost, self._extra_headers, x509 = self.get_host_info(host)
+        if host not in pool:
+            pool[host] = httplib.HTTPConnection(chost)
+
+        self._hosts.add(host)
+        conn = pool[host]
+
+        # An idle connection only becomes readable when the server closes it
+        if conn.sock is not None and select.select([conn.sock], [], [], 0)[0]:
+            conn.close()
+
+        # Proxies sharing the connection may have different timeouts
+        conn.timeout = self.timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(self.timeout)
+
+        return conn
+
+    def close(self):
+        """
+        Close this thread's connection, it is reopened by the next call
+        """
+        pool = self._pool()
+        for host in self._hosts:
+            conn = pool.pop(host, None)
+            if conn is not None:
+                conn.close()
 
 def rpc_method(func):
     """
@@ -46,6 +141,9 @@ class RPCAble(object):
         """        
         for func in self._xmlrpc_funcs:
             server.register_function(func)
+
+        # So clients can send a Batch of calls in one request
+        server.register_multicall_functions()
                         
 class RPCClientOverloadWrapper(object):
     """
@@ -56,8 +154,12 @@ class RPCClientOverloadWrapper(object):
     It is used when client-side functionality needs to be added to an RPC relationship
     An example of this is in client.Scheduler
     """
-    def __init__(self, hostname):
-        self._rpc = xmlrpclib.ServerProxy(hostname)
+    def __init__(self, hostname, timeout=None, rpc=None):
+        # rpc is a connection to use instead of an XML-RPC one, e.g. a binrpc.BinaryServerProxy
+        if rpc is None:
+            rpc = xmlrpclib.ServerProxy(hostname, transport=KeepAliveTransport(timeout))
+
+        self._rpc = rpc
 
         self.system = self._rpc.system
         
@@ -68,3 +170,91 @@ class RPCClientOverloadWrapper(object):
             if not hasattr(self, method_name):
                 setattr(self, method_name, getattr(self._rpc, method_name))            
 
+    def batch(self):
+        """
+        Return a Batch of calls to this connection, sent in one request
+        """
+        return Batch(self._rpc)
+
+class BatchResult(object):
+    """
+    The result of a call in a Batch, which can be had once the batch has been sent
+    """
+    def __init__(self, method):
+        self.method = method
+        self.done = False
+
+        self.value = None
+        self.fault = None
+
+    def get(self):
+        """
+        Return what the call returned, or raise the Fault it raised
+        """
+        if not self.done:
+            raise RuntimeError(self.method + " has not been sent yet")
+
+        if self.fault is not None:
+            raise self.fault
+
+        return self.value
+
+class Batch(object):
+    """
+    Queues calls to an RPC connection, and sends them all in one system.multicall request
+
+    Calling a method queues it and returns a BatchResult.  Used with a with statement the
+    calls are sent when the block ends:
+
+        with scicam.batch() as cam:
+            filename = cam.get_filename()
+            itime = cam.get_itime()
+
+        print filename.get(), itime.get()
+    """
+    def __init__(self, rpc):
+        self._rpc = rpc
+
+        # [ (method name, params, BatchResult) ]
+        self._calls = []
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def queue(*params):
+            result = BatchResult(name)
+            self._calls.append((name, params, result))
+
+            return result
+
+        return queue
+
+    def send(self):
+        """
+        Send the queued calls, and fill in their results
+        """
+        calls, self._calls = self._calls, []
+        if not calls:
+            return
+
+        responses = self._rpc.system.multicall([{'methodName' : name, 'params' : list(params)}
+                                                for name, params, result in calls])
+
+        for (name, params, result), response in zip(calls, responses):
+            # Each response is a list of the return value, or a fault as a dictionary
+            if isinstance(response, dict):
+                result.fault = xmlrpclib.Fault(response['faultCode'], response['faultString'])
+
+            else:
+                result.value = response[0]
+
+            result.done = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.send()
+
@@ -0,0 +1,75 @@
+"""
+Benchmark target selection latency of WeightedSingleScheduler against target count
+
+Compares the original per-target min(targets, key=cost) against CostEngine scoring
+the whole list in one pass.  Targets are synthetic, no database is needed.
+"""
+import os
+import sys
+import time
+import random
+import datetime
+
+from asi.scheduler import scheduler
+from asi.scheduler.cost import CostEngine
+from asi.scheduler.ephemeris import NightEphemeris
+
+W = scheduler.WeightedSingleScheduler
+
+class FakeStar(object):
+    def __init__(self):
+        self.ra_deg = random.uniform(0, 360)
+        self.dec_deg = random.uniform(-30, 90)
+
+class FakeTarget(object):
+    def __init__(self):
+        self.star = FakeStar()
+        self.star_id = id(self.star)
+        self.priority = 3
+
+def legacy_select(targets):
+    # Build a scheduler without touching the database or telescope
+    ws = W.__new__(W)
+    ws.tele_ra = ws.tele_dec = 0
+    ws.scheduled_time = {}
+    ws.history = None
+
+    # cost() prints for every target, which is part of its real cost, but not to the terminal
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        start = time.time()
+        min(targets, key=ws.cost)
+        return time.time() - start
+
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+def engine_select(targets, repeat=10):
+    engine = CostEngine(targets, W.HOUR_ANGLE_WEIGHT, W.DISTANCE_WEIGHT,
+                        W.MOON_DIST_WEIGHT, W.TIME_DELTA_WEIGHT)
+
+    # Built once a night by the scheduler, so not part of the selection time
+    now = time.time()
+    eph = NightEphemeris(scheduler.site, now, now + 3600)
+    eph.set_targets(engine.ra, engine.dec)
+
+    start = time.time()
+    for x in range(repeat):
+        ts = time.time()
+        engine.best(0, 0, eph.lst(ts), eph.moon_ra(ts), eph.moon_dec(ts),
+                    datetime.datetime.now())
+
+    return (time.time() - start) / repeat
+
+if __name__ == '__main__':
+    print "{0:>8} {1:>14} {2:>14} {3:>10}".format("targets", "legacy (ms)", "engine (ms)", "speedup")
+
+    for n in (10, 100, 1000, 5000, 20000):
+        targets = [FakeTarget() for x in range(n)]
+
+        legacy = legacy_select(targets)
+        engine = engine_select(targets)
+
+        print "{0:>8} {1:>14.3f} {2:>14.3f} {3:>9.1f}x".format(n, legacy * 1000, engine * 1000, legacy / engine)
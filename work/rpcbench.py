@@ -0,0 +1,166 @@
+"""
+Benchmark RPC calls per second and latency per call, for each way of calling a service
+
+XML-RPC with a new connection for every call, XML-RPC keeping the connection open, and the
+binary protocol(utils.binrpc, when msgpack is installed) are each run against a telescope
+simulator, in a thread of this process.  The original server answers HTTP/1.0, so each call
+opens a new connection.  The single threaded server(RequestHandler, as the run manager and
+unthreaded ServiceHosts serve) closes each connection after its call, and says so, and the
+threaded one(as ServiceHost serves) keeps it open.
+
+Calls are made back to back, then SPACED_CALLS of them SPACING seconds apart, as ready()
+polls are, counting the connections each needs.
+
+With an address, e.g. rpcbench.py http://localhost:7274, the running service at that
+address is used instead, and only the client transport differs.
+"""
+import sys
+import time
+import xmlrpclib
+import threading
+from SimpleXMLRPCServer import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+from asi.utils import binrpc
+from asi.utils.xmlrpc import RequestHandler, KeepAliveTransport
+from asi.utils.service import ThreadedXMLRPCServer, ThreadedRequestHandler
+from asi.telescope.simulator import TelescopeSimulator
+
+# Seconds to run each benchmark for
+DURATION = 5.
+
+# Calls made SPACING seconds apart, like polls
+SPACED_CALLS = 20
+SPACING = .1
+
+# Connections each local server has accepted, { address : count }
+connections = {}
+
+class ClosingTransport(xmlrpclib.Transport):
+    """
+    Close the connection after every call, as happens against an HTTP/1.0 server
+    """
+    def single_request(self, *args, **kwargs):
+        try:
+            return xmlrpclib.Transport.single_request(self, *args, **kwargs)
+
+        finally:
+            self.close()
+
+def serve(handler, server_class=SimpleXMLRPCServer):
+    """
+    Serve a telescope simulator with the request handler handler, returning its address
+    """
+    class CountingHandler(handler):
+        def setup(self):
+            connections[addr] += 1
+            handler.setup(self)
+
+    server = server_class(("localhost", 0),
+                          requestHandler=CountingHandler,
+                          logRequests=False,
+                          allow_none=True)
+    server.timeout = .001
+    server.register_introspection_functions()
+
+    addr = 'http://localhost:{port}'.format(port=server.server_address[1])
+    connections[addr] = 0
+
+    telescope = TelescopeSimulator()
+    telescope.register_xmlrpc_functions(server)
+
+    def loop():
+        while 1:
+            telescope.update()
+            server.handle_request()
+
+    thread = threading.Thread(target=loop)
+    thread.daemon = True
+    thread.start()
+
+    return addr
+
+def serve_binary():
+    """
+    Serve a telescope simulator over the binary protocol, returning its (host, port)
+    """
+    server = binrpc.BinaryRPCServer(("localhost", 0))
+    server.timeout = .001
+    server.register_introspection_functions()
+
+    telescope = TelescopeSimulator()
+    telescope.register_xmlrpc_functions(server)
+
+    def loop():
+        while 1:
+            telescope.update()
+            server.handle_request()
+
+    thread = threading.Thread(target=loop)
+    thread.daemon = True
+    thread.start()
+
+    return server.server_address
+
+def bench(proxy, duration=DURATION):
+    """
+    Call ready() as fast as possible for duration seconds, return (calls/s, ms per call)
+    """
+    n = 0
+    start = time.time()
+    while time.time() - start < duration:
+        proxy.ready()
+        n += 1
+
+    elapsed = time.time() - start
+
+    return n / elapsed, 1000 * elapsed / n
+
+def spaced(proxy, n=SPACED_CALLS, spacing=SPACING):
+    """
+    Call ready() n times, spacing seconds apart, return ms per call
+    """
+    elapsed = 0
+    for x in range(n):
+        start = time.time()
+        proxy.ready()
+        elapsed += time.time() - start
+
+        time.sleep(spacing)
+
+    return 1000 * elapsed / n
+
+def report(name, proxy, addr=None):
+    rate, latency = bench(proxy)
+
+    before = connections.get(addr)
+    spaced_latency = spaced(proxy)
+
+    # Only known for the servers run here
+    new = connections[addr] - before if before is not None else ''
+
+    print "{0:<24} {1:>10.0f} {2:>12.3f} {3:>14.3f} {4:>12}".format(name, rate, latency, spaced_latency, new)
+
+if __name__ == '__main__':
+    print "{0:<24} {1:>10} {2:>12} {3:>14} {4:>12}".format("transport", "calls/s", "ms/call",
+                                                           "spaced ms/call", "connections")
+
+    if len(sys.argv) > 1:
+        addr = sys.argv[1]
+        closing = single = keepalive = addr
+        binary = binrpc.binary_address(addr)
+
+    else:
+        closing = serve(SimpleXMLRPCRequestHandler)
+        single = serve(RequestHandler)
+        keepalive = serve(ThreadedRequestHandler, ThreadedXMLRPCServer)
+        binary = serve_binary() if binrpc.available() else None
+
+    report("new connection", xmlrpclib.ServerProxy(closing, allow_none=True, transport=ClosingTransport()), closing)
+    report("single threaded", xmlrpclib.ServerProxy(single, allow_none=True, transport=KeepAliveTransport()), single)
+    report("keep-alive", xmlrpclib.ServerProxy(keepalive, allow_none=True, transport=KeepAliveTransport()), keepalive)
+
+    if binrpc.available():
+        report("binary", binrpc.BinaryServerProxy(binary))
+
+    else:
+        print "msgpack is not installed, skipping the binary protocol"